@@ -23,33 +23,95 @@ import pandas as pd
 import sqlite3 as sql
 import time
 import sys
+import importlib.util
 sys.path.append( pysrc )
+
+def lazy_import(name: str):
+    """
+    Returns module name, executed on its first attribute access (importlib.util.LazyLoader), so a run never
+        loads the subsystems it does not use; a module that cannot be found still fails here.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
 #
-import names, island, population, movies, human, nomad 
+names, island, population, movies, human, nomad = map(lazy_import, ['names', 'island', 'population', 'movies', 'human', 'nomad'])
 
 sys.path.append('/Users/eric/Documents/CDS465/archieve/Dev_P1/') #Location of initialization.py
-import initialization as initf 
+initf = lazy_import('initialization')
 import operations as ops
+from orderledger import OrderLedger
+from costing import CostEngine
+from codes import MMCodes
+from accounts import Accounts
+from payroll import Payroll
+from eventlog import EventLog
+from orderstream import OrderStream
+from profiler import StageProfiler
+import checkpoint, storage, projection, siting, catalog, islandmap, archive
 
-import sqlaccess, firstmigration
+sqlaccess, firstmigration = map(lazy_import, ['sqlaccess', 'firstmigration'])
 
 #%%
+class deferred:
+    """
+    Realm attribute that is loaded on first access: loader(realm) sets it (and whatever is loaded with it)
+        on the instance, after which it is a plain instance attribute.
+    """
+    def __init__(self, loader):
+        self.loader = loader
+    def __set_name__(self, owner, name):
+        self.name = name
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        self.loader(obj)
+        if self.name not in obj.__dict__:
+            raise AttributeError(f'{self.loader.__name__} did not set Realm.{self.name}')
+        return obj.__dict__[self.name]
+
 class Realm:
-    def __init__(self, datadir):
+    def _open_dna(self):
         # Load DNA cursor
         dnaname = 'dnastats.db'
-        dnaconn = sql.connect(datadir + dnaname )
+        dnaconn = sql.connect(self.datadir + dnaname )
         self.dnacur = dnaconn.cursor()
         act = 'SELECT COUNT(*) FROM main'
         self.dnacur.execute( act )
-        # load names
-        self.bnames, self.gnames, self.lnames = names.LoadNames( datadir )
-        # load island
-        self.isle = island.LoadIsland( datadir + 'island.pickle')
+    def _load_names(self):
+        self.bnames, self.gnames, self.lnames = names.LoadNames( self.datadir )
+    def _load_island(self):
+        # layers are memory mapped next to island.pickle and shared by every Realm (islandmap.py); draw on islandmap.canvas(self.isle)
+        self.isle = islandmap.load( self.datadir + 'island.pickle', island.LoadIsland, self.mapisland )
         #self.isle = island.InitCardinalIsland( datadir + 'island.png')
+    def _load_movies(self):
+        movies.CreateMoviesDFs( self, self.datadir )
+
+    # with lazy=True these are loaded the first time they are used (MM-only runs never touch DNA, names or movies)
+    dnacur = deferred(_open_dna)
+    bnames, gnames, lnames = deferred(_load_names), deferred(_load_names), deferred(_load_names)
+    isle = deferred(_load_island)
+    moviesdf, inmoviedf = deferred(_load_movies), deferred(_load_movies)
+
+    def __init__(self, datadir, lazy=False, mapisland=True):
+        self.datadir = datadir
+        self.mapisland = mapisland # False: unpickle a private, writable island
+        if not lazy:
+            self._open_dna()
+            self._load_names()
+            self._load_island()
         # Empty DFs
         population.EmptyDFs( self )
-        movies.CreateMoviesDFs( self, datadir )
+        if not lazy:
+            self._load_movies()
         self.usemovies= False # turn on when ready to use movies
         # params
         self.marriageradius = False # radius is not restricted
@@ -57,6 +119,17 @@ class Realm:
         ###START CHANGES P1
         self.folderpath: str = None #store folderpath
         self.loc_gen_dict: dict = None #store model params
+        self.mm_orders: OrderLedger = None #append-only store of mm_order_master
+        self.mm_costing: CostEngine = None #prices orders from the cached bill of materials
+        self.mm_codes: MMCodes = None #integer location ids and product/resource/manufacture codes
+        self.mm_accounts: Accounts = None #balances and the open mm_books period as arrays
+        self.mm_payroll: Payroll = None #pays employees through a pid -> persondf row index
+        self.mm_order_stream: OrderStream = None #monthly qa_simulate_orders batches
+        self.mm_events: EventLog = None #append-only log of hires, fires, orders and postings
+        self.mm_catalog: catalog.Catalog = None #compiled BASE_DATA master tables, price list and bill of materials
+        self.mm_person_index = None #spatial index over persondf; rebuilt once per month by mm_hr
+        self.mm_eligibility = None #who mm_hr may hire, as a mask over persondf rows; kept up to date by eligibility.py
+        self.mm_archive: archive.Archive = None #closed orders and accounting periods spilled to disk; opened by archive.retain
         self.mm_params = {
             'dbug': True,
             'mm_debt_thold': -50000,
@@ -67,8 +140,18 @@ class Realm:
             'begin_month': None,
             'n_orders': 150,
             'xbar_order_size': 500,
-            'employee_pay': 50000
+            'order_seed': 666,
+            'employee_pay': 50000,
+            'max_queue_delay': 3,
+            'profile': False,
+            'events': True, #record mm_events
+            'events_path': None, #directory to flush mm_events to; None keeps them in memory
+            'archive_path': None, #directory to spill closed orders and accounting periods to (archive.py); None keeps them in memory
+            'archive_keep': 12, #months closed orders and periods stay in memory before they are spilled
+            'archive_format': 'parquet',
+            'backend': 'numpy' #kernels of the books, payroll and employee checks: 'numpy' or 'numba' (kernels.py)
         } #store additional params
+        self.mm_profiler = StageProfiler() #per stage timings of EvolveMM; turned on by mm_params['profile']
 
     def InitializeMM(self):
         """
@@ -83,8 +166,18 @@ class Realm:
             if self.mm_params['dbug']: print('no need to evolve. initializing...')
 
         self.mm_params['begin_month'] = self.month #store the beginning month
-        self.mm_dfs = initf.initialize_mm(self,self.folderpath,self.loc_gen_dict)
-        self.mm_dfs['qa_sandbox_orders'] = self.initfSimulateOrders()
+        self.mm_catalog = catalog.load(self.folderpath)
+        self.mm_dfs = siting.initialize_mm(self, self.folderpath, self.loc_gen_dict) #initf.initialize_mm with vectorized siting and hiring
+        self.mm_codes = MMCodes(self)
+        self.mm_codes.encode_tables(self.mm_dfs) #integer keys next to location_coord and the string ids
+        self.mm_accounts = Accounts(self)
+        self.mm_payroll = Payroll(self)
+        self.mm_events = EventLog(self.mm_params['events_path'], self.mm_params['events'])
+        self.mm_costing = CostEngine(self)
+        self.mm_orders = OrderLedger(self.mm_costing.price(self.mm_dfs['mm_order_master']), clock=self.month)
+        ops.set_manufacture_capacity(self) #orders per month each location can complete
+        self.mm_order_stream = OrderStream(self)
+        self.mm_dfs['qa_sandbox_orders'] = self.mm_order_stream.batch(self.month, draw=1) #opening orders
         
     def initfQuickLook(self, n: int = 5):
         """Prints the head of each dataframe, given n the number of records to show"""
@@ -93,6 +186,7 @@ class Realm:
     def initfSimulateOrders(self, ordersdf: pd.DataFrame = None) -> pd.DataFrame:
         """
         This function simulates the B2B sales between manufacturers and customers.
+            -EvolveMM draws its monthly orders from self.mm_order_stream instead (see orderstream.py)
 
         inpts:
             stores_orders_df (pd.DataFrame): the qa_sandbox_orders df
@@ -126,41 +220,86 @@ class Realm:
             if addpeep>0:
                 nomad.Immigrate( self, addpeep, dometh )
 
-    def EvolveMM(self, Nmonths, addpeep, dometh, migrate=False):
-        """The Realm.Evolve function that has been revamped to model MM processes"""
+    def EvolveMM(self, Nmonths, addpeep, dometh, migrate=False, on_month=None):
+        """
+        The Realm.Evolve function that has been revamped to model MM processes
+            -on_month(self) is called at the end of every month, e.g. a render.FrameWriter
+        """
+        prof = self.mm_profiler
+        prof.enabled = self.mm_params['profile']
         testingtime, evotime = float(), float()
+        order_batches = self.mm_order_stream.batches(self.month, Nmonths) #one batch of orders per month
+        pending = self.mm_dfs['qa_sandbox_orders']
+        pending = pending.loc[pending['order_date'] >= self.month] #orders simulated ahead, e.g. the opening orders of InitializeMM
         for i in range( Nmonths ):
             #stuff before evolve
             preop_b = time.perf_counter()
-            self.mm_dfs['qa_sandbox_orders'] = self.initfSimulateOrders(self.mm_dfs['qa_sandbox_orders'])
-            ops.preopsMM(self, self.mm_dfs['qa_sandbox_orders'])
+            with prof.stage('simulate_orders', self.month) as rec:
+                orders = batch = next(order_batches)
+                if len(pending) > 0:
+                    orders = pd.concat([pending.loc[pending['order_date'] == self.month], orders], ignore_index=True)
+                rec.rows_out = len(orders)
+            ops.preopsMM(self, orders)
             preop_e = time.perf_counter()
 
             #if self.mm_params['dbug']: print(f'Time to run preops at month {self.month} is {(preop_e-preop_b):.4f} seconds')
 
             #Evolve
             ev_b = time.perf_counter()
-            self.Evolve(1, addpeep, dometh, migrate)
+            with prof.stage('evolve', self.month + 1, rows_in=len(self.persondf)) as rec:
+                self.Evolve(1, addpeep, dometh, migrate)
+                rec.rows_out = len(self.persondf)
             ev_e = time.perf_counter()
 
             #if self.mm_params['dbug']: print(f'Time to run original evolve is {(ev_e-ev_b):.4f} seconds')
 
             #stuff after evolve
             postop_b = time.perf_counter()
-            ccpdf = self.initfCalcCostProfit(self.mm_dfs['mm_order_master'])
-            ops.postopsMM(self, ccpdf)
+            with prof.stage('calc_cost_profit', self.month) as rec:
+                self.mm_costing.calc_cost_profit(self.mm_orders) #orders are priced once, when recieved
+                rec.rows_out = self.mm_orders.n_active(self.month)
+            ops.postopsMM(self)
+            if self.mm_params['archive_path'] is not None:
+                with prof.stage('archive', self.month):
+                    archive.retain(self) #spill closed orders and periods past archive_keep
             postop_e = time.perf_counter()
+            if on_month is not None:
+                on_month(self)
 
             #if self.mm_params['dbug']: print(f'Time to run original postops is {(postop_e-postop_b):.4f} seconds. \nTotal time was {(postop_e-preop_b):.4f} seconds.')
 
             testingtime += ((preop_e-preop_b) + (postop_e-postop_b))
             evotime += (ev_e-ev_b)
+        if Nmonths > 0: #only the orders simulated ahead and the latest batch are kept; the ledger holds the history
+            self.mm_dfs['qa_sandbox_orders'] = pd.concat([pending.loc[pending['order_date'] >= self.month], batch], ignore_index=True)
+        self.mm_dfs['mm_order_master'] = self.mm_orders.to_frame(archived=False) #materialize the orders in memory once per run; see MMHistory
+        self.mm_accounts.sync() #write balances and the open mm_books rows back into mm_dfs
+        self.mm_events.flush()
         if self.mm_params['dbug']: print(f'Total added time due to operations was {testingtime} seconds. \nTotal time due to Evolve was {evotime} seconds.')
+        if prof.enabled and self.mm_params['dbug']: print(prof.report())
 
 
+    def ProjectMM(self, Nmonths, schedule=None, save_every=None, fname=None, fmt='sqlite'):
+        """
+        EvolveMM for MM-only studies: the population is frozen (or changed by schedule) and the MM economy is
+            projected in arrays, written back at the end (see projection.py)
+        """
+        projection.project_mm(self, Nmonths, schedule, save_every, fname, fmt)
+
+    def MMHistory(self, table, begin_month=None, end_month=None):
+        """
+        Returns the mm_order_master (by order_date) or mm_books (by period_s) rows in [begin_month, end_month],
+            including the ones spilled to mm_archive; only the archived partitions in the range are read
+        """
+        return archive.history(self, table, begin_month, end_month)
+
     def InitialMigration( self, months, locs, pmrange, pct ):
         firstmigration.FirstMigration( self, months, locs, pmrange, pct )
     def ReadAll( self, fname ):
+        if storage.is_columnar( fname ):
+            # arrow/parquet checkpoint directory written by SaveAll( fname, fmt )
+            storage.read_columnar( self, fname )
+            return
         conn = sql.connect( fname )
         self.persondf = pd.read_sql( 'SELECT * FROM person', conn, index_col='index' ) 
         self.jaildf = pd.read_sql( 'SELECT * FROM jail', conn, index_col='index' ) 
@@ -175,7 +314,15 @@ class Realm:
         # storing empty DFs may cause dtype changes
         dct =  {'husband':int, 'wife':int, 'date':int, 'divorce':int, 'spdie':int}
         self.weddf = self.weddf.astype( dct )
-    def SaveAll( self, fname ):
+        # MM state, if the file has it; EvolveMM can resume without InitializeMM
+        checkpoint.read_mm( self, conn )
+    def SaveAll( self, fname, fmt='sqlite', compression=None ):
+        if self.mm_accounts is not None:
+            self.mm_accounts.sync()
+        # fmt: 'sqlite' (one .db file), or 'arrow'/'parquet' (a directory of columnar files, see storage.py)
+        if fmt != 'sqlite':
+            storage.save_columnar( self, fname, fmt, compression )
+            return
         conn = sql.connect( fname )
         cur = conn.cursor()
         act = 'DROP TABlE IF EXISTS clock'
@@ -189,6 +336,9 @@ class Realm:
         self.missingdf.to_sql( 'missing', conn, if_exists='replace')
         self.moviesdf.to_sql( 'movies', conn, if_exists='replace')
         self.inmoviedf.to_sql( 'inmovie', conn,  if_exists='replace')
+        if self.mm_orders is not None:
+            # mm_dfs, order ledger and mm_params; order/books/sandbox rows are appended incrementally
+            checkpoint.save_mm( self, conn )
         conn.commit()
     
         
@@ -0,0 +1,133 @@
+"""Array-backed balances, open mm_books period and per-location solvency for the MM accounts."""
+###import dependencies
+import numpy as np
+import pandas as pd
+import kernels
+
+#mm_books columns held as arrays for the open period
+BOOK_COLS = ['balance_s', 'balance_e', 'period_income', 'sales_tax']
+
+class Accounts:
+    """
+    Keeps the open accounting period as dense arrays.
+        -balance: one entry per mm_location_master row; row_loc is each row's location_id
+        -balance_s, balance_e, period_income, sales_tax: one entry per open mm_books row; book_loc is each row's location_id
+        -postings are amounts per location_id; they are summed per location with np.bincount and
+            scattered onto the rows of that location, so no frame is filtered or merged per posting
+            (through the kernels of mm_params['backend'], see kernels.py)
+        -mm_dfs is only brought up to date by sync() (end of EvolveMM, SaveAll) and close_period()
+        -solvent: one entry per location_id; False if any row of the location is below the debt threshold.
+            post() and close_period() update it for the locations they touch; see solvency()
+
+    inpts:
+        realmc (class Realm obj): E, after mm_codes is built
+    """
+    def __init__(self, realmc):
+        self.realmc = realmc
+        self.n_loc = len(realmc.mm_codes)
+        location_master = realmc.mm_dfs['mm_location_master']
+        self.row_loc = location_master['location_id'].to_numpy()
+        self.balance = location_master['balance'].fillna(0.0).to_numpy(dtype=float).copy()
+        self.solvent = np.ones(self.n_loc, dtype=bool)
+        self.debt_thold = None #threshold solvent was computed with; set by solvency()
+        self._open(realmc.mm_dfs['mm_books'])
+        self.solvency()
+
+    def _open(self, mm_books: pd.DataFrame):
+        """loads the latest period of mm_books into the arrays"""
+        self.period_s = mm_books['period_s'].max()
+        q1 = mm_books['period_s'] == self.period_s
+        self.book_rows = mm_books.index[q1] #labels of the open rows in mm_books
+        self.book_loc = mm_books.loc[q1, 'location_id'].to_numpy()
+        for col in BOOK_COLS:
+            setattr(self, col, mm_books.loc[q1, col].fillna(0.0).to_numpy(dtype=float).copy())
+
+    def per_location(self, location_ids, amounts) -> np.ndarray:
+        """sums amounts per location_id; entries with location_id -1 are dropped"""
+        amounts = np.nan_to_num(np.asarray(amounts, dtype=float))
+        return kernels.backend(self.realmc).per_location(np.asarray(location_ids), amounts, self.n_loc)
+
+    def _check(self, income: np.ndarray = None):
+        """rechecks solvent for the locations with a non-zero posting in income (every location if income is None)"""
+        rows = np.arange(len(self.balance)) if income is None else np.flatnonzero(income[self.row_loc])
+        loc = self.row_loc[rows]
+        self.solvent[loc] = True
+        self.solvent[loc[self.balance[rows] < self.debt_thold]] = False
+
+    def solvency(self) -> np.ndarray:
+        """
+        Returns the solvency mask by location_id (True: no row of the location is below mm_params['mm_debt_thold']);
+            recomputed in full only if the threshold changed since the last call.
+
+        opts:
+            a copy of the mask, so it does not change with later postings
+        """
+        thold = self.realmc.mm_params['mm_debt_thold']
+        if thold != self.debt_thold:
+            self.debt_thold = thold
+            self.solvent[:] = True
+            self._check()
+        return self.solvent.copy()
+
+    def post(self, income: np.ndarray = None, sales_tax: np.ndarray = None):
+        """
+        Posts per location_id amounts (see per_location) to the open period.
+
+        inpts:
+            income (np.ndarray): credits (+) and debits (-) to balance and period_income
+            sales_tax (np.ndarray): sales tax collected; booked to sales_tax only
+        """
+        k = kernels.backend(self.realmc)
+        if income is not None:
+            k.scatter_add(self.balance, income, self.row_loc)
+            k.scatter_add(self.period_income, income, self.book_loc)
+            self._check(income)
+        if sales_tax is not None:
+            k.scatter_add(self.sales_tax, sales_tax, self.book_loc)
+
+    def sync(self):
+        """writes the arrays into mm_location_master.balance and the open mm_books rows"""
+        mm_dfs = self.realmc.mm_dfs
+        mm_dfs['mm_location_master']['balance'] = self.balance
+        mm_dfs['mm_books'].loc[self.book_rows, BOOK_COLS] = np.column_stack([getattr(self, col) for col in BOOK_COLS])
+
+    def close_period(self, month: int, cit_rate: float, mask: np.ndarray = None) -> np.ndarray:
+        """
+        Closes the quarter: pays CIT on positive period income out of the balance, sets balance_e,
+            writes the closed rows to mm_books and opens the next period's rows starting at month + 1.
+
+        inpts:
+            mask (np.ndarray): by location_id; only the locations that are True pay CIT (e.g. solvency()); None for all
+
+        opts:
+            the CIT paid by location_id
+        """
+        taxed = np.ones(len(self.book_loc), dtype=bool) if mask is None else mask[self.book_loc]
+        cit = kernels.backend(self.realmc).cit(self.period_income, cit_rate, taxed)
+
+        #subtract calculated cit tax from current balance and period income
+        cit_paid = self.per_location(self.book_loc, cit)
+        self.balance -= cit_paid[self.row_loc]
+        self._check(cit_paid)
+        self.period_income -= cit
+        self.balance_e = self.balance_s + self.period_income
+        self.sync()
+
+        ## populate a new set of location coords
+        codes = self.realmc.mm_codes
+        new_books = pd.DataFrame({'location_coord': list(codes.locations[self.book_loc])})
+        new_books['period_s'] = month + 1
+        new_books['period_e'] = new_books['period_s'] + 2
+        new_books['balance_s'] = self.balance_e
+        new_books['balance_e'] = 0.0 #will be calculated later
+        new_books['period_income'] = 0.0
+        new_books['sales_tax'] = 0.0
+        new_books['location_id'] = self.book_loc
+
+        #labels continue from the last row, so they stay unique across the periods spilled to mm_archive
+        mm_books = self.realmc.mm_dfs['mm_books']
+        start = mm_books.index.max() + 1 if len(mm_books) else 0
+        new_books.index = pd.RangeIndex(start, start + len(new_books))
+        self.realmc.mm_dfs['mm_books'] = pd.concat([mm_books, new_books])
+        self._open(self.realmc.mm_dfs['mm_books'])
+        return cit_paid
@@ -0,0 +1,123 @@
+"""Month-partitioned on-disk archive of closed orders and accounting periods for long runs."""
+###import dependencies
+import numpy as np
+import pandas as pd
+
+#table : partition key
+PARTITION_KEYS = {'mm_order_master': 'order_date', 'mm_books': 'period_s'}
+
+class Archive:
+    """
+    Month-partitioned archive of MM tables in one directory.
+
+    inpts:
+        path (str): archive directory; created on the first spill
+        fmt (str): 'parquet' or 'arrow' (see storage.FORMATS); read from the directory if it exists
+        compression (str): codec for new files; None for the format's default
+        parent (Archive): archive to read the partitions this one does not have from (e.g. the base Realm's,
+            for a scenario that spills to its own path)
+        attach (bool): also read the partitions already in path (written by another run or process)
+    """
+    def __init__(self, path: str, fmt: str = 'parquet', compression: str = None, parent=None, attach: bool = False):
+        self.path = path
+        self.fmt = fmt
+        self.compression = compression
+        self.parent = parent
+        self.store = None #ColumnarStore of path; opened on the first write or read
+        self.keys = {table: set() for table in PARTITION_KEYS} #partitions written (or attached) by this archive
+        if attach:
+            for table, keys in self._store().meta.get('partitions', {}).items():
+                self.keys[table].update(keys)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['store'] = None #reopened on demand; the store holds the pyarrow module
+        return state
+
+    def _store(self):
+        if self.store is None:
+            from storage import ColumnarStore, is_columnar #pyarrow is only needed once something is archived
+            self.store = ColumnarStore(self.path, None if is_columnar(self.path) else self.fmt, self.compression)
+        return self.store
+
+    @staticmethod
+    def _name(table: str, key: int) -> str:
+        return f'{table}_{int(key):06d}'
+
+    def partitions(self, table: str) -> list:
+        """returns the partition keys of table, here or in the parent archives"""
+        keys = set(self.keys[table])
+        if self.parent is not None:
+            keys.update(self.parent.partitions(table))
+        return sorted(keys)
+
+    def write(self, table: str, df: pd.DataFrame):
+        """writes the rows of df to their partitions of table; a partition that already exists is replaced"""
+        store = self._store()
+        for key, part in df.groupby(PARTITION_KEYS[table], sort=True):
+            store.write(self._name(table, key), part)
+            self.keys[table].add(int(key))
+        saved = store.meta.get('partitions', {})
+        saved[table] = sorted(set(saved.get(table, [])) | self.keys[table])
+        store.write_meta({'partitions': saved})
+
+    def read_partition(self, table: str, key: int) -> pd.DataFrame:
+        """returns one partition of table, with the index it was written with"""
+        if int(key) in self.keys[table]:
+            return self._store().read(self._name(table, key))
+        if self.parent is not None:
+            return self.parent.read_partition(table, key)
+        raise KeyError(f'{table} has no archived partition {key}')
+
+    def read(self, table: str, begin: int = None, end: int = None) -> pd.DataFrame:
+        """
+        Reads the archived rows of table with begin <= partition key <= end; only those partitions are opened.
+
+        opts:
+            the rows in partition order; None if no partition is in the range
+        """
+        keys = [k for k in self.partitions(table) if (begin is None or k >= begin) and (end is None or k <= end)]
+        frames = [self.read_partition(table, k) for k in keys]
+        return pd.concat(frames) if frames else None
+
+def retain(realmc):
+    """
+    Applies the retention policy of realmc.mm_params: closed orders placed, and closed accounting periods ended,
+        more than archive_keep months ago are spilled to realmc.mm_archive (opened at archive_path on first use).
+        Does nothing while archive_path is None.
+    """
+    params = realmc.mm_params
+    path = params.get('archive_path')
+    if path is None:
+        return
+    arch = realmc.mm_archive
+    if arch is None or arch.path != path:
+        arch = realmc.mm_archive = Archive(path, params.get('archive_format', 'parquet'), parent=arch)
+
+    cutoff = realmc.month - params.get('archive_keep', 12)
+    realmc.mm_orders.spill(arch, cutoff)
+
+    books = realmc.mm_dfs['mm_books']
+    q1 = ((books['period_e'] < cutoff) & (books['period_s'] < realmc.mm_accounts.period_s)).to_numpy()
+    if q1.any():
+        arch.write('mm_books', books.loc[q1])
+        realmc.mm_dfs['mm_books'] = books.loc[~q1] #labels are kept, so the open rows of mm_accounts stay valid
+
+def history(realmc, table: str, begin_month: int = None, end_month: int = None) -> pd.DataFrame:
+    """
+    Returns the rows of mm_order_master (by order_date) or mm_books (by period_s) in [begin_month, end_month],
+        archived and in memory, in the order they would have in a run without archiving.
+    """
+    if table == 'mm_order_master':
+        return realmc.mm_orders.between(begin_month, end_month)
+    key = PARTITION_KEYS[table]
+    df = realmc.mm_dfs[table]
+    q1 = np.ones(len(df), dtype=bool)
+    if begin_month is not None:
+        q1 &= (df[key] >= begin_month).to_numpy()
+    if end_month is not None:
+        q1 &= (df[key] <= end_month).to_numpy()
+    df = df.loc[q1]
+    arch = getattr(realmc, 'mm_archive', None)
+    old = None if arch is None else arch.read(table, begin_month, end_month)
+    return df if old is None else pd.concat([old, df])
@@ -0,0 +1,297 @@
+"""Benchmark of InitializeMM plus EvolveMM on synthetic populations, with stand-ins for the population modules."""
+###import dependencies
+import argparse
+import json
+import os
+import sqlite3 as sql
+import sys
+import tempfile
+import time
+import types
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DATA = os.path.join(BASE_DIR, 'BASE_DATA') + os.sep
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'bench_baseline.json')
+ISLAND_SIZE = 2048
+CHUNK_SIZE = 64 #mm_params['chunk_size']
+START_MONTH = 1200 #multiple of 12 so InitializeMM does not need to evolve for parity
+
+#name : (number of people, number of locations asked for in loc_gen_dict; select_location may find fewer)
+SCALES = {
+    'p1k_l50': (1_000, 50),
+    'p10k_l50': (10_000, 50),
+    'p10k_l500': (10_000, 500),
+    'p100k_l500': (100_000, 500),
+}
+
+#Synthetic fixtures
+def make_island(seed: int = 0, n_deposits: int = 600) -> dict:
+    """
+    Builds a 2048x2048 island: a noisy ellipse of land in water, with deposits of each resource.
+        -isle['raw'] is a float image whose color channels are (ore, raw, energy) like the real island;
+            initialization treats values > resource_threshold (0.9) as a resource
+
+    opts:
+        dict with 'raw' (float32 image) and 'land' (bool mask)
+    """
+    rng = np.random.default_rng(seed)
+    v, h = np.mgrid[0:ISLAND_SIZE, 0:ISLAND_SIZE] / ISLAND_SIZE
+    r = ((v - 0.5) / 0.42)**2 + ((h - 0.5) / 0.36)**2
+    coarse = rng.random((64, 64))
+    noise = np.kron(coarse, np.ones((ISLAND_SIZE // 64, ISLAND_SIZE // 64)))
+    land = r + 0.25*(noise - 0.5) < 1.0
+
+    raw = np.empty((ISLAND_SIZE, ISLAND_SIZE, 3), dtype=np.float32)
+    raw[~land] = [0.1, 0.2, 0.6] #water
+    raw[land] = [0.4, 0.6, 0.3] #land
+
+    #a small disc of ore, raw or energy next to n_deposits chunk centers on land
+    #   (select_location only looks for resources within a few pixels of a chunk center)
+    centers = np.arange(CHUNK_SIZE // 2, ISLAND_SIZE, CHUNK_SIZE)
+    cv, ch = np.meshgrid(centers, centers, indexing='ij')
+    cv, ch = cv.ravel(), ch.ravel()
+    on_land = np.flatnonzero(land[cv, ch])
+    disc = (np.arange(-2, 3)[:, None]**2 + np.arange(-2, 3)[None, :]**2) <= 4
+    for i in rng.choice(on_land, size=min(n_deposits, len(on_land)), replace=False):
+        channel = rng.integers(3)
+        view = raw[cv[i]-2+3:cv[i]+3+3, ch[i]-2:ch[i]+3, channel] #off center so a resource location is not also a chunk center
+        view[disc] = 0.95
+    return {'raw': raw, 'land': land}
+
+def make_persondf(n: int, isle: dict, month: int = START_MONTH, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds a synthetic persondf of n living people on land, clustered around a handful of towns.
+    """
+    rng = np.random.default_rng(seed)
+    land_vh = np.argwhere(isle['land'])
+    towns = land_vh[rng.choice(len(land_vh), size=max(4, n // 250), replace=False)]
+
+    #draw around towns and keep the points that land on the island
+    vh = np.empty((0, 2), dtype=float)
+    while len(vh) < n:
+        t = towns[rng.integers(len(towns), size=2*n)]
+        pts = np.round(t + rng.normal(0, 40, size=(2*n, 2)))
+        pts = pts[((pts >= 0) & (pts < ISLAND_SIZE)).all(axis=1)]
+        pts = pts[isle['land'][pts[:, 0].astype(int), pts[:, 1].astype(int)]]
+        vh = np.vstack([vh, pts])
+    vh = vh[:n]
+
+    return pd.DataFrame({
+        'pid': np.arange(n),
+        'firstname': 'first',
+        'lastname': 'last',
+        'gender': rng.integers(0, 2, n),
+        'birth': month - rng.integers(0, 80*12, n),
+        'death': -1,
+        'job': rng.choice([0.0, 1.0, 2.0, 4.0], n),
+        'locv': vh[:, 0],
+        'loch': vh[:, 1],
+        'savings': np.round(rng.random(n) * 1000, 2),
+    })
+
+def make_loc_gen_dict(n_locations: int) -> dict:
+    """splits n_locations over the subdomains like the notebooks' loc_gen_dict (farming, mining, manufacturing)"""
+    third = n_locations // 3
+    return {
+        'farming': (third, 40, 5),
+        'mining': (third, 80, 10),
+        'energy': (0, 50, 20),
+        'manufacturing': (n_locations - 2*third, 100, 20),
+    }
+
+#Stand-ins for the population side of the Realm
+def one_month(realmc, dometh, migrate=False):
+    """stubbed population.OneMonth: 0.1% of the living die and 1% move a little each month"""
+    rng = np.random.default_rng(realmc.month)
+    alive = np.flatnonzero(realmc.persondf['death'].to_numpy() < 0)
+    dead = rng.choice(alive, size=len(alive) // 1000, replace=False)
+    realmc.persondf.iloc[dead, realmc.persondf.columns.get_loc('death')] = realmc.month
+
+    moved = rng.choice(alive, size=len(alive) // 100, replace=False)
+    step = rng.normal(0, 30, size=(len(moved), 2)).round()
+    cols = [realmc.persondf.columns.get_loc(c) for c in ['locv', 'loch']]
+    vh = np.clip(realmc.persondf.iloc[moved, cols].to_numpy() + step, 0, ISLAND_SIZE - 1)
+    realmc.persondf.iloc[moved, cols] = vh
+
+def empty_dfs(realmc):
+    """stand-in for population.EmptyDFs"""
+    realmc.persondf = pd.DataFrame()
+    realmc.jaildf, realmc.weddf, realmc.hospdf = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    realmc.portdf, realmc.missingdf = pd.DataFrame(), pd.DataFrame()
+    realmc.month = START_MONTH
+
+def install_standins(isle: dict):
+    """registers stand-in modules for the pysrc population modules Main2 imports"""
+    modules = {
+        'names': {'LoadNames': lambda datadir: ([], [], [])},
+        'island': {'LoadIsland': lambda fname: isle},
+        'population': {'EmptyDFs': empty_dfs, 'OneMonth': one_month},
+        'movies': {'CreateMoviesDFs': lambda realmc, datadir: None},
+        'human': {},
+        'nomad': {'Immigrate': lambda realmc, N, dometh: None},
+        'sqlaccess': {'CreateClock': lambda conn, cur, month: None},
+        'firstmigration': {'FirstMigration': lambda *args: None},
+    }
+    for name, attrs in modules.items():
+        mod = types.ModuleType(name)
+        mod.__dict__.update(attrs)
+        sys.modules[name] = mod
+
+def make_datadir() -> str:
+    """temp datadir with the dnastats.db that Realm.__init__ opens"""
+    datadir = tempfile.mkdtemp(prefix='mm_bench_') + os.sep
+    conn = sql.connect(datadir + 'dnastats.db')
+    conn.execute('CREATE TABLE main (x INTEGER)')
+    conn.commit()
+    conn.close()
+    return datadir
+
+#Benchmark
+def make_realm(Main2, n_people: int, n_locations: int, isle: dict, datadir: str, seed: int = 0):
+    """returns a Realm (lazy=True) with a synthetic population, after InitializeMM"""
+    E = Main2.Realm(datadir, lazy=True) #the stand-in island is loaded when siting first reads it
+    E.persondf = make_persondf(n_people, isle, seed=seed)
+    E.loc_gen_dict = make_loc_gen_dict(n_locations)
+    E.folderpath = BASE_DATA
+    E.mm_params['dbug'] = False
+    E.mm_params['profile'] = True
+    E.InitializeMM()
+    return E
+
+def run_scale(Main2, name: str, n_people: int, n_locations: int, months: int, isle: dict, datadir: str, seed: int = 0) -> dict:
+    """
+    Runs InitializeMM plus months of EvolveMM at one scale.
+
+    opts:
+        dict of the timings and throughput of the run, with the per stage timings under 'stages'
+    """
+    t0 = time.perf_counter()
+    E = make_realm(Main2, n_people, n_locations, isle, datadir, seed)
+    init_s = time.perf_counter() - t0
+
+    n0 = len(E.mm_orders)
+    t0 = time.perf_counter()
+    E.EvolveMM(months, 0, 0, False)
+    evolve_s = time.perf_counter() - t0
+    n_orders = len(E.mm_orders) - n0
+
+    stages = E.mm_profiler.report()
+    return {
+        'scale': name,
+        'people': n_people,
+        'locations': len(E.mm_dfs['mm_location_master']),
+        'months': months,
+        'init_seconds': init_s,
+        'evolve_seconds': evolve_s,
+        'orders': n_orders,
+        'orders_per_sec': n_orders / evolve_s,
+        'months_per_sec': months / evolve_s,
+        'stages': dict(zip(stages['stage'], stages['mean_seconds'])),
+    }
+
+def startup(Main2, datadir: str, repeat: int = 5) -> dict:
+    """
+    Times Realm.__init__ with everything loaded up front (lazy=False) and with the DNA db, names, island
+        and movies deferred to first use (lazy=True).
+
+    opts:
+        dict of the best of repeat timings in seconds, by mode
+    """
+    res = {}
+    for mode, lazy in [('eager', False), ('lazy', True)]:
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            Main2.Realm(datadir, lazy=lazy)
+            times.append(time.perf_counter() - t0)
+        res[mode] = min(times)
+    return res
+
+def compare(results: list, baseline: dict, tolerance: float) -> pd.DataFrame:
+    """returns current vs baseline throughput per scale; slower than (1 - tolerance) x baseline is flagged"""
+    rows = []
+    for res in results:
+        base = baseline.get(res['scale'])
+        if base is None:
+            continue
+        for key in ['months_per_sec', 'orders_per_sec']:
+            ratio = res[key] / base[key]
+            rows.append([res['scale'], key, base[key], res[key], ratio, ratio < 1 - tolerance])
+        for stage, sec in res['stages'].items():
+            if stage in base['stages']:
+                ratio = base['stages'][stage] / sec
+                rows.append([res['scale'], stage, base['stages'][stage], sec, ratio, ratio < 1 - tolerance])
+    return pd.DataFrame(rows, columns=['scale', 'metric', 'baseline', 'current', 'speed_ratio', 'regression'])
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark InitializeMM + EvolveMM on synthetic populations')
+    parser.add_argument('--scales', nargs='+', default=['p1k_l50', 'p10k_l50'], choices=list(SCALES))
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before a metric is flagged')
+    parser.add_argument('--check-backends', action='store_true', help='run kernels.compare_backends on each scale and exit')
+    args = parser.parse_args(argv)
+
+    isle = make_island(args.seed)
+    install_standins(isle)
+    sys.path.insert(0, BASE_DIR)
+    t0 = time.perf_counter()
+    import Main2
+    import_s = time.perf_counter() - t0
+
+    datadir = make_datadir()
+    init = startup(Main2, datadir)
+    print(f"startup: import Main2 {import_s*1000:.1f} ms, Realm() {init['eager']*1000:.2f} ms, "
+          f"Realm(lazy=True) {init['lazy']*1000:.2f} ms")
+    if args.check_backends:
+        import kernels
+        backends = [b for b in kernels.BACKENDS if kernels.available(b)]
+        skipped = sorted(set(kernels.BACKENDS) - set(backends))
+        if skipped:
+            print(f'backends {skipped} are not installed; not compared')
+        if len(backends) < 2:
+            return 0
+        for b in backends[1:]:
+            kernels.check_kernels(b, seed=args.seed)
+            print(f'{b}: kernels identical to numpy')
+        for name in args.scales:
+            n_people, n_locations = SCALES[name]
+            E = make_realm(Main2, n_people, n_locations, isle, datadir, args.seed)
+            seconds = kernels.compare_backends(E, args.months, args.seed, tuple(backends))
+            print(f"{name}: books identical over {args.months} months; " + ', '.join(f'{k} {v:.3f}s' for k, v in seconds.items()))
+        return 0
+
+    results = []
+    for name in args.scales:
+        n_people, n_locations = SCALES[name]
+        res = run_scale(Main2, name, n_people, n_locations, args.months, isle, datadir, args.seed)
+        results.append(res)
+        print(f"{name}: init {res['init_seconds']:.3f}s, {res['months']} months in {res['evolve_seconds']:.3f}s "
+              f"({res['months_per_sec']:.2f} months/s, {res['orders_per_sec']:.0f} orders/s)")
+        for stage, sec in sorted(res['stages'].items(), key=lambda x: -x[1]):
+            print(f'    {stage:<18}{sec*1000:10.2f} ms/month')
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({res['scale']: res for res in results})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report = compare(results, json.load(f), args.tolerance)
+        print(report.to_string(index=False))
+        return int(report['regression'].any())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
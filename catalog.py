@@ -0,0 +1,92 @@
+"""Compiled, cached catalog of the BASE_DATA master tables, price list and bill of materials."""
+###import dependencies
+import hashlib
+import os
+import pickle
+import pandas as pd
+from costing import flat_bom, price_fingerprint
+
+CACHE_FILE = '.mm_catalog.pkl'
+PRICE_LIST = 'qa_sandbox_orders.csv'
+VERSION = 1 #bump when the layout of the cache changes
+
+#order of the frames returned by initialization.create_mm_dfs
+MM_TABLES = ['mm_product_master', 'mm_manufacture_master', 'mm_resource_master', 'mm_location_master',
+             'mm_books', 'mm_order_master', 'mm_employee_master']
+
+_loaded: dict = {} #folder : Catalog already loaded by this process
+
+class Catalog:
+    """
+    The compiled BASE_DATA of one folder.
+
+    inpts:
+        key (str): hash of the CSV files the catalog was compiled from
+        tables (dict): MM_TABLES : DataFrame as returned by initialization.create_mm_dfs
+        prices (pd.DataFrame): the price list (product_id, sell price, manufacture_time)
+    """
+    def __init__(self, key: str, tables: dict, prices: pd.DataFrame):
+        self.key = key
+        self.tables = tables
+        self.prices = prices
+        self.price_key = price_fingerprint(tables) #CostEngine.fingerprint of the masters as read
+        self.bom = flat_bom(tables)
+
+    def create_mm_dfs(self) -> tuple:
+        """returns copies of the frames of initialization.create_mm_dfs, in its order"""
+        return tuple(self.tables[name].copy() for name in MM_TABLES)
+
+def source_key(folder_path: str) -> str:
+    """returns a hash of the names and contents of the CSV files in folder_path"""
+    h = hashlib.sha1()
+    for name in sorted(f for f in os.listdir(folder_path) if f.endswith('.csv')):
+        h.update(name.encode())
+        with open(os.path.join(folder_path, name), 'rb') as f:
+            h.update(hashlib.sha1(f.read()).digest())
+    return h.hexdigest()
+
+def compile_catalog(folder_path: str, key: str = None) -> Catalog:
+    """reads and parses the CSVs of folder_path into a Catalog"""
+    import initialization as initf #only needed when the cache is missing or stale
+    tables = dict(zip(MM_TABLES, initf.create_mm_dfs(folder_path)))
+    prices = pd.read_csv(os.path.join(folder_path, PRICE_LIST), encoding='utf-8-sig')
+    return Catalog(key or source_key(folder_path), tables, prices)
+
+def load(folder_path: str, cache: bool = True) -> Catalog:
+    """
+    Returns the catalog of folder_path, from this process, the cache file or the CSVs (in that order);
+        a catalog whose key no longer matches the CSVs is compiled again.
+
+    inpts:
+        folder_path (str): realmc.folderpath (BASE_DATA)
+        cache (bool): read and write the cache file; if the folder is read only the catalog is only kept in memory
+    """
+    key = source_key(folder_path)
+    folder = os.path.abspath(folder_path)
+    cat = _loaded.get(folder)
+    if cat is not None and cat.key == key:
+        return cat
+
+    path = os.path.join(folder, CACHE_FILE)
+    cat = None
+    if cache and os.path.isfile(path):
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+            if saved.get('version') == VERSION and saved.get('key') == key:
+                cat = saved['catalog']
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            cat = None #unreadable cache: compile again
+
+    if cat is None:
+        cat = compile_catalog(folder_path, key)
+        if cache:
+            try:
+                tmp = path + '.tmp'
+                with open(tmp, 'wb') as f:
+                    pickle.dump({'version': VERSION, 'key': key, 'catalog': cat}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except OSError:
+                pass
+    _loaded[folder] = cat
+    return cat
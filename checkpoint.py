@@ -0,0 +1,241 @@
+"""Saves and restores the MM state of a Realm to the SaveAll / ReadAll sqlite file."""
+###import dependencies
+import json
+import numpy as np
+import pandas as pd
+import operations as ops
+import archive
+from orderledger import OrderLedger
+from costing import CostEngine
+from codes import MMCodes
+from accounts import Accounts
+from payroll import Payroll
+from eventlog import EventLog
+from orderstream import OrderStream
+
+#tables rewritten in full on every save
+#   -qa_sandbox_orders: only the orders simulated ahead and the latest batch (see Realm.EvolveMM)
+FULL_TABLES = ['mm_location_master', 'mm_employee_master', 'mm_product_master', 'mm_manufacture_master', 'mm_resource_master',
+               'qa_sandbox_orders']
+
+#tables appended to; each keeps a watermark in mm_meta
+#   -mm_order_master: orders placed on/after the oldest month with an open order are rewritten
+#   -mm_books: the latest accounting period (and anything after) is rewritten
+INCREMENTAL_TABLES = ['mm_order_master', 'mm_books']
+
+META_TABLE = 'mm_meta' #key/value (json) rows: mm_params, loc_gen_dict, folderpath, watermarks
+SCHEMA_TABLE = 'mm_schema' #one row per saved column: dtype and codec
+
+#Realm attributes saved in mm_meta next to the tables
+MM_META = ['mm_params', 'loc_gen_dict', 'folderpath']
+
+#Encoding helpers
+def json_default(obj):
+    """lets json write numpy scalars and arrays"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f'{type(obj)} is not json serializable')
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, default=json_default)
+
+def _as_tuple(obj):
+    """json gives back lists; turns them (and nested lists) back into tuples"""
+    return tuple(_as_tuple(o) for o in obj) if isinstance(obj, list) else obj
+
+def _codec(col: pd.Series) -> str:
+    """returns 'tuple' or 'list' if the object column holds tuples or lists; else ''"""
+    if col.dtype != object:
+        return ''
+    first = col.dropna()
+    if len(first) == 0:
+        return ''
+    first = first.iloc[0]
+    if isinstance(first, tuple):
+        return 'tuple'
+    if isinstance(first, (list, np.ndarray)):
+        return 'list'
+    return ''
+
+def schema(df: pd.DataFrame) -> dict:
+    """returns {column: (dtype, codec)} for df"""
+    return {c: (str(df[c].dtype), _codec(df[c])) for c in df.columns}
+
+def encode(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """returns a copy of df with the tuple/list columns in cols written as json text"""
+    df = df.copy()
+    for c, (dtype, codec) in cols.items():
+        if codec:
+            df[c] = [None if v is None else _dumps(v) for v in df[c]]
+    return df
+
+def decode(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """inverse of encode; also casts every column back to its saved dtype"""
+    for c, (dtype, codec) in cols.items():
+        if c not in df.columns:
+            continue
+        if codec == 'tuple':
+            df[c] = [None if v is None else _as_tuple(json.loads(v)) for v in df[c]]
+        elif codec == 'list':
+            df[c] = [None if v is None else json.loads(v) for v in df[c]]
+        elif str(df[c].dtype) != dtype:
+            df[c] = df[c].astype(dtype)
+    return df
+
+#Meta tables
+def sqlite_tables(conn) -> set:
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+def read_meta(conn) -> dict:
+    """returns the mm_meta rows as a dict; empty if the file has no MM checkpoint"""
+    if META_TABLE not in sqlite_tables(conn):
+        return {}
+    return {k: json.loads(v) for k, v in conn.execute(f'SELECT key, value FROM {META_TABLE}')}
+
+def write_meta(conn, meta: dict):
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)')
+    conn.executemany(f'INSERT OR REPLACE INTO {META_TABLE} VALUES (?, ?)', [(k, _dumps(v)) for k, v in meta.items()])
+
+def read_schema(conn) -> dict:
+    """returns {table: {column: (dtype, codec)}}, columns in saved order"""
+    out = {}
+    if SCHEMA_TABLE not in sqlite_tables(conn):
+        return out
+    for tbl, col, dtype, codec in conn.execute(f'SELECT tbl, col, dtype, codec FROM {SCHEMA_TABLE} ORDER BY rowid'):
+        out.setdefault(tbl, {})[col] = (dtype, codec)
+    return out
+
+def write_schema(conn, tbl: str, cols: dict):
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} (tbl TEXT, col TEXT, dtype TEXT, codec TEXT)')
+    conn.execute(f'DELETE FROM {SCHEMA_TABLE} WHERE tbl = ?', (tbl,))
+    conn.executemany(f'INSERT INTO {SCHEMA_TABLE} VALUES (?, ?, ?, ?)', [(tbl, c, d, k) for c, (d, k) in cols.items()])
+
+#Save / read
+def _write(conn, tbl: str, df: pd.DataFrame, cols: dict, if_exists: str):
+    encode(df, cols).to_sql(tbl, conn, if_exists=if_exists, index=True, index_label='index')
+
+def save_mm(realmc, conn):
+    """
+    Writes the MM state of realmc to conn (a sqlite3 connection); called by Realm.SaveAll.
+        -full tables are replaced; incremental tables only get the rows past the watermarks
+            stored by the previous save to the same file, so saving every month stays cheap
+        -an incremental table is rewritten in full if the file has no watermark for it or its dtypes changed
+        -the caller commits
+
+    inpts:
+        realmc (class Realm obj): E, after InitializeMM
+        conn (sqlite3.Connection): the SaveAll connection
+    """
+    tables = sqlite_tables(conn)
+    saved_schema = read_schema(conn)
+    watermarks = read_meta(conn).get('watermarks', {})
+    watermarks.pop('qa_sandbox_orders', None) #from files saved while qa_sandbox_orders was incremental
+    ledger = realmc.mm_orders
+    frames = {tbl: realmc.mm_dfs[tbl] for tbl in FULL_TABLES + INCREMENTAL_TABLES if tbl in realmc.mm_dfs}
+
+    #the ledger is the live copy of mm_order_master; only materialize the months that get written
+    wm = watermarks.get('mm_order_master')
+    if wm is not None:
+        frames['mm_order_master'] = ledger.between(wm)
+    else:
+        frames['mm_order_master'] = ledger.to_frame()
+
+    for tbl, df in frames.items():
+        cols = schema(df)
+        wm = watermarks.get(tbl)
+        full = tbl in FULL_TABLES or wm is None or tbl not in tables or cols != saved_schema.get(tbl)
+        if full and tbl == 'mm_order_master' and wm is not None:
+            df = ledger.to_frame()
+            cols = schema(df)
+        if full and tbl == 'mm_books':
+            df = archive.history(realmc, 'mm_books') #a full save includes the periods spilled to mm_archive
+        if full:
+            _write(conn, tbl, df, cols, 'replace')
+        elif tbl == 'mm_order_master':
+            #rows are stored in month order, so the months from wm on are the tail of the table
+            conn.execute('DELETE FROM mm_order_master WHERE order_date >= ?', (wm,))
+            start = conn.execute('SELECT COUNT(*) FROM mm_order_master').fetchone()[0]
+            _write(conn, tbl, df.set_axis(range(start, start + len(df))), cols, 'append')
+        else:
+            conn.execute('DELETE FROM mm_books WHERE period_s >= ?', (wm,))
+            _write(conn, tbl, df.loc[df['period_s'] >= wm], cols, 'append')
+        write_schema(conn, tbl, cols)
+
+    #move the watermarks up to what can still change after this save
+    if ledger.open_months:
+        watermarks['mm_order_master'] = int(min(ledger.open_months))
+    elif ledger.chunks or ledger.archived:
+        watermarks['mm_order_master'] = int(max(ledger.chunks.keys() | ledger.archived)) + 1
+    if len(frames['mm_books']) > 0:
+        watermarks['mm_books'] = int(frames['mm_books']['period_s'].max())
+
+    write_meta(conn, {**mm_meta(realmc), 'watermarks': watermarks})
+
+def mm_meta(realmc) -> dict:
+    """returns the non-table MM state of realmc that a checkpoint has to keep"""
+    return {k: getattr(realmc, k) for k in MM_META}
+
+def load_mm(conn) -> tuple:
+    """
+    Reads the MM tables and meta saved by save_mm.
+
+    opts:
+        (mm_dfs, meta); (None, {}) if the file has no MM checkpoint
+    """
+    meta = read_meta(conn)
+    if not meta:
+        return None, meta
+    saved_schema = read_schema(conn)
+
+    mm_dfs = {}
+    for tbl in FULL_TABLES + INCREMENTAL_TABLES:
+        if tbl not in saved_schema:
+            continue
+        df = pd.read_sql(f'SELECT * FROM {tbl}', conn, index_col='index')
+        df.index.name = None
+        mm_dfs[tbl] = decode(df, saved_schema[tbl])
+
+    #the incremental tables are rewritten out of order; put them back in order
+    mm_dfs['mm_order_master'] = mm_dfs['mm_order_master'].sort_index().reset_index(drop=True)
+    mm_dfs['mm_books'] = mm_dfs['mm_books'].sort_index()
+    return mm_dfs, meta
+
+def restore_mm(realmc, mm_dfs: dict, meta: dict):
+    """
+    Puts checkpointed MM state back into realmc and rebuilds the order ledger and cost engine,
+        so EvolveMM can continue without InitializeMM
+    """
+    realmc.mm_params.update(meta['mm_params'])
+    realmc.loc_gen_dict = {k: _as_tuple(v) for k, v in meta['loc_gen_dict'].items()} if meta['loc_gen_dict'] else meta['loc_gen_dict']
+    realmc.folderpath = meta['folderpath']
+    realmc.mm_dfs = mm_dfs
+    realmc.mm_codes = MMCodes(realmc)
+    realmc.mm_codes.encode_tables(mm_dfs)
+    realmc.mm_codes.encode_frame(mm_dfs['mm_order_master'], ['product_id'])
+    realmc.mm_catalog = None #loaded from folderpath by the first order batch
+    realmc.mm_accounts = Accounts(realmc)
+    realmc.mm_payroll = Payroll(realmc)
+    realmc.mm_events = EventLog(realmc.mm_params.get('events_path'), realmc.mm_params.get('events', True))
+    realmc.mm_costing = CostEngine(realmc)
+    realmc.mm_orders = OrderLedger(mm_dfs['mm_order_master'], clock=realmc.month)
+    realmc.mm_archive = None #reopened at mm_params['archive_path'] by the next archive.retain
+    ops.set_manufacture_capacity(realmc)
+    realmc.mm_person_index = None
+    realmc.mm_eligibility = None
+    sandbox = mm_dfs.get('qa_sandbox_orders')
+    realmc.mm_order_stream = OrderStream(realmc, sandbox['order_id'].iloc[-1] if sandbox is not None and len(sandbox) else None)
+
+def read_mm(realmc, conn) -> bool:
+    """
+    Restores the MM state saved by save_mm into realmc; called by Realm.ReadAll.
+
+    opts:
+        True if the file held an MM checkpoint; else False (realmc is left as is)
+    """
+    mm_dfs, meta = load_mm(conn)
+    if mm_dfs is None:
+        return False
+    restore_mm(realmc, mm_dfs, meta)
+    return True
@@ -0,0 +1,87 @@
+"""Integer location ids and product/resource/manufacture codes for the MM tables."""
+###import dependencies
+import numpy as np
+import pandas as pd
+
+#readable column : integer column
+CODE_COLS = {
+    'location_coord': 'location_id',
+    'product_id': 'product_code',
+    'resource_id': 'resource_code',
+    'manufacture_id': 'manufacture_code',
+}
+
+#mm_dfs table : readable columns that get an integer column next to them
+TABLE_CODES = {
+    'mm_location_master': ['location_coord'],
+    'mm_employee_master': ['location_coord'],
+    'mm_books': ['location_coord'],
+    'mm_product_master': ['product_id', 'manufacture_id', 'location_coord'],
+    'mm_manufacture_master': ['manufacture_id', 'resource_id'],
+    'mm_resource_master': ['resource_id', 'location_coord'],
+}
+
+class MMCodes:
+    """
+    Dictionaries from the readable keys of the MM tables to dense integer codes.
+        -location_id numbers the distinct location_coords of mm_location_master in row order; vh[location_id] is its (v, h)
+        -product/resource/manufacture codes are row positions in products/resources/manufactures
+        -the readable columns are kept in mm_dfs (initialization.py and the notebooks use them);
+            the integer columns are added next to them and are what operations.py works on
+        -unknown keys encode to -1
+
+    inpts:
+        realmc (class Realm obj): E, after mm_dfs is populated
+    """
+    def __init__(self, realmc):
+        mm_dfs = realmc.mm_dfs
+        self.locations = pd.Index(mm_dfs['mm_location_master']['location_coord'].unique(), tupleize_cols=False)
+        self.products = pd.Index(mm_dfs['mm_product_master']['product_id'].unique())
+        self.resources = pd.Index(mm_dfs['mm_resource_master']['resource_id'].unique())
+        self.manufactures = pd.Index(pd.concat([mm_dfs['mm_product_master']['manufacture_id'],
+                                                mm_dfs['mm_manufacture_master']['manufacture_id']]).unique())
+        self.index = {
+            'location_coord': self.locations,
+            'product_id': self.products,
+            'resource_id': self.resources,
+            'manufacture_id': self.manufactures,
+        }
+
+        #packed (v, h) per location_id; coords are whole pixels, so int32 unless a coord is fractional
+        vh = np.array(self.locations.tolist(), dtype=float).reshape(-1, 2)
+        self.vh = vh.astype(np.int32) if np.array_equal(vh, np.round(vh)) else vh
+
+    def __len__(self) -> int:
+        """number of locations"""
+        return len(self.locations)
+
+    def encode(self, values, col: str) -> np.ndarray:
+        """returns the integer codes of values (a column named col); -1 for keys that are not known"""
+        if col == 'location_coord':
+            values = pd.Index(list(values), tupleize_cols=False) #keep the tuples as keys
+        return self.index[col].get_indexer(values)
+
+    def encode_frame(self, df: pd.DataFrame, cols: list = None) -> pd.DataFrame:
+        """adds (or refreshes) the integer column of each readable column in cols, in place"""
+        for col in cols or [c for c in CODE_COLS if c in df.columns]:
+            df[CODE_COLS[col]] = self.encode(df[col], col)
+        return df
+
+    def encode_tables(self, mm_dfs: dict):
+        """adds the integer columns to the mm_dfs tables (see TABLE_CODES)"""
+        for tbl, cols in TABLE_CODES.items():
+            if tbl in mm_dfs:
+                self.encode_frame(mm_dfs[tbl], cols)
+
+    def decode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Decode view for reporting: returns a copy of df with the readable columns rebuilt from the integer
+            columns and the integer columns dropped.
+        """
+        out = df.copy()
+        for col, code in CODE_COLS.items():
+            if code in out.columns:
+                keys = np.append(self.index[col].to_numpy(dtype=object), None) #code -1 -> None
+                out[col] = keys[out[code].to_numpy()]
+                out = out.drop(columns=code)
+        return out
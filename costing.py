@@ -0,0 +1,151 @@
+"""Prices orders once on arrival from a cached bill of materials."""
+###import dependencies
+import hashlib
+import numpy as np
+import pandas as pd
+
+#columns of the price tables that the bill of materials depends on
+PRICE_COLS = {
+    'mm_product_master': ['product_id', 'manufacture_id', 'manufacture_cost'],
+    'mm_manufacture_master': ['manufacture_id', 'resource_id', 'resource_quantity'],
+    'mm_resource_master': ['resource_id', 'resource_cost'],
+}
+
+#columns added to an order when it is priced
+PRICED_COLS = ['cost', 'sales_tax', 'profit']
+
+def price_fingerprint(tables: dict) -> str:
+    """returns a hash of the PRICE_COLS of the product, manufacture and resource masters in tables"""
+    h = hashlib.sha1()
+    for name, cols in PRICE_COLS.items():
+        h.update(pd.util.hash_pandas_object(tables[name][cols], index=False).values.tobytes())
+    return h.hexdigest()
+
+def flat_bom(tables: dict) -> pd.DataFrame:
+    """joins the product -> manufacture -> resource masters in tables into one row per product and resource"""
+    bom = pd.merge(tables['mm_product_master'][PRICE_COLS['mm_product_master']],
+                pd.merge(tables['mm_manufacture_master'][PRICE_COLS['mm_manufacture_master']],
+                         tables['mm_resource_master'][PRICE_COLS['mm_resource_master']],
+                         on='resource_id'),
+                on='manufacture_id'
+            )
+    bom['unit_resource_cost'] = bom['resource_quantity'] * bom['resource_cost']
+    return bom
+
+class CostEngine:
+    """
+    Caches the flattened product -> manufacture -> resource bill of materials and prices orders against it.
+        -the bill of materials is only rebuilt when one of the price tables changes; the join is taken from
+            realmc.mm_catalog (catalog.py) while the tables still match BASE_DATA
+        -orders are priced once on arrival; open orders are repriced only if the price tables change
+
+    inpts:
+        realmc (class Realm obj): E, must have mm_dfs and mm_params
+    """
+    def __init__(self, realmc):
+        self.realmc = realmc
+        self.key: str = None #fingerprint of the price tables the cache was built from
+        self.bom: pd.DataFrame = None #one row per product_id
+        self.unit_cost: np.ndarray = None #COGS per unit by product_code; nan for products without a bill of materials
+        self.bom_quantity: np.ndarray = None #resource_quantity per unit of product; product_code x resource_code
+        self.resource_costs: np.ndarray = None #resource_cost by resource_code
+        self.refresh()
+
+    def fingerprint(self) -> str:
+        """returns a hash of the price columns of the product, manufacture and resource masters"""
+        return price_fingerprint(self.realmc.mm_dfs)
+
+    def refresh(self) -> bool:
+        """
+        Rebuilds the bill of materials if the price tables changed since the last build.
+
+        opts:
+            True if the cache was rebuilt; else False
+        """
+        key = self.fingerprint()
+        if key == self.key:
+            return False
+
+        cat = getattr(self.realmc, 'mm_catalog', None)
+        bom = cat.bom if cat is not None and cat.price_key == key else flat_bom(self.realmc.mm_dfs)
+
+        self.bom = bom.groupby('product_id').agg(
+                unit_cost=('unit_resource_cost', 'sum'),
+                manufacture_cost=('manufacture_cost', 'first')
+            )
+        self.bom['unit_cost'] += self.bom['manufacture_cost'] #COGS per unit: manufacturing + resources
+
+        #unit cost, dense product x resource quantity matrix and resource cost vector, indexed by the integer codes
+        codes = self.realmc.mm_codes
+        self.unit_cost = self.bom['unit_cost'].reindex(codes.products).to_numpy(dtype=float)
+        self.bom_quantity = np.zeros((len(codes.products), len(codes.resources)))
+        np.add.at(self.bom_quantity,
+                  (codes.encode(bom['product_id'], 'product_id'), codes.encode(bom['resource_id'], 'resource_id')),
+                  bom['resource_quantity'].to_numpy(dtype=float))
+        self.resource_costs = bom.drop_duplicates('resource_id').set_index('resource_id')['resource_cost'].reindex(codes.resources).to_numpy(dtype=float)
+
+        self.key = key
+        return True
+
+    def priceable(self, product_codes: np.ndarray) -> np.ndarray:
+        """True for the product_codes that have a bill of materials (a unit cost)"""
+        code = np.asarray(product_codes)
+        return (code >= 0) & np.isfinite(self.unit_cost[np.maximum(code, 0)])
+
+    def price(self, orders: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calculates the COGS, sales tax and profit of each order.
+            -orders for products without a bill of materials are dropped, like the inner merge of calc_cost_profit
+
+        inpts:
+            orders (pd.DataFrame): orders following the data standards of mm_order_master
+
+        opts:
+            a copy of the priceable orders with product_code and PRICED_COLS added; the index of orders is kept
+        """
+        code = self.realmc.mm_codes.encode(orders['product_id'], 'product_id')
+        keep = self.priceable(code)
+        priced = orders.loc[keep].drop(columns=PRICED_COLS, errors='ignore').copy()
+        priced['product_code'] = code = code[keep]
+        priced['cost'] = priced['product_quantity'] * self.unit_cost[code]
+        priced['sales_tax'] = priced['account_receivable'] * self.realmc.mm_params['sales_tax_rate']
+        priced['profit'] = priced['account_receivable'] - priced['cost']
+        return priced
+
+    def reprice(self, ledger):
+        """reprices the orders in the ledger that are still in production; orders whose product lost its bill of materials keep their price"""
+        ledger.settle()
+        for m in ledger.open_months:
+            chunk = ledger.chunks[m]
+            priced = self.price(chunk.loc[chunk['order_status'] > 0])
+            chunk.loc[priced.index, PRICED_COLS] = priced[PRICED_COLS]
+
+    def resource_payout(self, orders: pd.DataFrame) -> np.ndarray:
+        """
+        Calculates the monies passed through to each raw resource for the given orders.
+
+        inpts:
+            orders (pd.DataFrame): priced orders
+
+        opts:
+            an array of the payout by resource_code
+        """
+        return self.resource_payout_codes(orders['product_code'].to_numpy(dtype=int), orders['product_quantity'].to_numpy(dtype=float))
+
+    def resource_payout_codes(self, product_codes: np.ndarray, quantities: np.ndarray) -> np.ndarray:
+        """
+        resource_payout for orders given as arrays of product_code and product_quantity.
+            -each order's resource cost is rounded to the cent before it is summed, so the
+                product quantities are broadcast against bom_quantity instead of a plain matrix product
+        """
+        p = np.asarray(product_codes)
+        q = np.asarray(quantities, dtype=float)[p >= 0]
+        r_cost = np.round(q[:, None] * self.bom_quantity[p[p >= 0]] * self.resource_costs, 2) #calc resource cost
+        return np.nan_to_num(r_cost.sum(axis=0)) #resources that are in no bill of materials get nothing
+
+    def calc_cost_profit(self, ledger):
+        """
+        Reprices the open orders of ledger if a price table changed; orders are otherwise priced once, when recieved (see price).
+        """
+        if self.refresh():
+            self.reprice(ledger)
@@ -0,0 +1,113 @@
+"""Incrementally maintained mask over persondf rows of the people mm_hr may hire."""
+###import dependencies
+import numpy as np
+import pandas as pd
+
+ADULT_AGE = 18*12 #months
+NO_JOB = (0.0, 1.0) #persondf.job codes that cannot take a job at MM
+
+class EligibilityIndex:
+    """
+    Keeps the eligibility flags of the rows of persondf for one month at a time (see refresh).
+
+    inpts:
+        persondf (pd.DataFrame): realmc.persondf
+        month (int): realmc.month
+    """
+    def __init__(self, persondf: pd.DataFrame, month: int):
+        self.persondf = persondf
+        self.month = month
+        self.pids = persondf['pid'].to_numpy().copy()
+        self.birth = persondf['birth'].to_numpy(dtype=float).copy()
+        self.adult = np.zeros(len(persondf), dtype=bool)
+        self.alive = np.zeros(len(persondf), dtype=bool)
+        self.free = np.zeros(len(persondf), dtype=bool) #alive and job available
+        self.young = np.arange(len(persondf)) #rows that are not adults yet
+        self.living = np.arange(len(persondf)) #rows that were alive at the last refresh
+        self.employed = np.zeros(len(persondf), dtype=np.int64) #mm_employee_master rows per person
+        self.employee_pids: np.ndarray = None #the employee pids employed was counted for
+        self._update()
+
+    def __len__(self) -> int:
+        return len(self.pids)
+
+    def _update(self):
+        """rechecks the young and the living rows for the current month"""
+        became = self.birth[self.young] <= self.month - ADULT_AGE
+        self.adult[self.young[became]] = True
+        self.young = self.young[~became]
+
+        rows = self.living
+        alive = self.persondf['death'].to_numpy()[rows] < 0
+        job = self.persondf['job'].to_numpy(dtype=float)[rows]
+        self.alive[rows] = alive
+        self.free[rows] = alive & ~np.isin(job, NO_JOB)
+        self.living = rows[alive]
+
+    def _append(self, persondf: pd.DataFrame):
+        """adds the rows of persondf past the ones indexed"""
+        n, new = len(self.pids), persondf.iloc[len(self.pids):]
+        rows = np.arange(n, len(persondf))
+        self.pids = np.concatenate([self.pids, new['pid'].to_numpy()])
+        self.birth = np.concatenate([self.birth, new['birth'].to_numpy(dtype=float)])
+        for name in ('adult', 'alive', 'free'):
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros(len(rows), dtype=bool)]))
+        self.employed = np.concatenate([self.employed, np.zeros(len(rows), dtype=np.int64)])
+        self.young = np.concatenate([self.young, rows])
+        self.living = np.concatenate([self.living, rows])
+        self.employee_pids = None #new rows may be employees listed before they were indexed
+
+    def extends(self, persondf: pd.DataFrame) -> bool:
+        """True if persondf is the indexed frame with (possibly) rows appended"""
+        if persondf is self.persondf and len(persondf) == len(self.pids):
+            return True
+        return len(persondf) >= len(self.pids) and np.array_equal(persondf['pid'].to_numpy()[:len(self.pids)], self.pids)
+
+    def refresh(self, persondf: pd.DataFrame, month: int):
+        """brings the index up to persondf and month; persondf must extend the indexed frame (see extends)"""
+        if persondf is self.persondf and len(persondf) == len(self.pids) and month == self.month:
+            return
+        self.persondf = persondf
+        self.month = month
+        if len(persondf) > len(self.pids):
+            self._append(persondf)
+        self._update()
+
+    def count(self, employee_pids: np.ndarray):
+        """recounts employed from the pids of mm_employee_master if they changed since the last count"""
+        if self.employee_pids is not None and np.array_equal(employee_pids, self.employee_pids):
+            return
+        pos = pd.Index(self.pids).get_indexer(employee_pids)
+        self.employed = np.bincount(pos[pos >= 0], minlength=len(self.pids))
+        self.employee_pids = np.array(employee_pids, copy=True)
+
+    def hire(self, old_pos: np.ndarray, new_pos: np.ndarray, employee_pids: np.ndarray):
+        """
+        Posts the replacements of mm_hr: one employee row moved from old_pos to new_pos each (-1 for people not in persondf);
+            the fired lose their job (job 0.0). employee_pids is mm_employee_master.pid after the hires.
+        """
+        old_pos, new_pos = np.asarray(old_pos), np.asarray(new_pos)
+        np.add.at(self.employed, old_pos[old_pos >= 0], -1)
+        np.add.at(self.employed, new_pos[new_pos >= 0], 1)
+        self.free[old_pos[old_pos >= 0]] = False
+        self.employee_pids = np.array(employee_pids, copy=True)
+
+    def available(self) -> np.ndarray:
+        """adults who are alive and can take a job, employed or not"""
+        return self.adult & self.free
+
+    def eligible(self, employee_pids: np.ndarray) -> np.ndarray:
+        """available() people who are not in employee_pids (mm_employee_master.pid)"""
+        self.count(employee_pids)
+        return self.adult & self.free & (self.employed == 0)
+
+def eligibility_index(realmc) -> EligibilityIndex:
+    """
+    Returns realmc.mm_eligibility brought up to realmc.persondf and realmc.month, building it if there is none
+        or persondf was replaced by a different population.
+    """
+    index = realmc.mm_eligibility
+    if index is None or not index.extends(realmc.persondf):
+        index = realmc.mm_eligibility = EligibilityIndex(realmc.persondf, realmc.month)
+    index.refresh(realmc.persondf, realmc.month)
+    return index
@@ -0,0 +1,139 @@
+"""Append-only log of MM hires, fires, orders and postings."""
+###import dependencies
+import numpy as np
+import pandas as pd
+
+#column : dtype; -1 / '' / nan where a column does not apply to an event
+EVENT_COLS = {
+    'month': np.int64,
+    'event': object,
+    'location_id': np.int64,
+    'pid': np.int64,
+    'other_pid': np.int64, #hire: the employee replaced
+    'order_id': object,
+    'amount': float,
+}
+
+#event : what it records
+EVENTS = {
+    'hire': 'pid hired at location_id, replacing other_pid',
+    'fire': 'pid let go from location_id',
+    'order_accepted': 'order_id accepted for manufacturing at location_id; amount = account_receivable',
+    'order_rejected': 'order_id rejected (no capacity) at location_id; amount = account_receivable',
+    'order_completed': 'order_id completed at location_id; amount = profit',
+    'sale': 'profit of the orders completed this month, posted to location_id',
+    'resource_payout': 'resource costs passed through to location_id',
+    'sales_tax': 'sales tax collected by location_id (not in balance)',
+    'wages': 'wages paid by location_id (negative)',
+    'cit': 'corporate income tax paid by location_id (negative)',
+}
+
+#postings that change mm_location_master.balance
+BALANCE_EVENTS = ['sale', 'resource_payout', 'wages', 'cit']
+
+class EventLog:
+    """
+    Columnar, append-only log of MM events.
+
+    inpts:
+        path (str): directory to write the flushed chunks to; None keeps them in memory
+        enabled (bool): record events; False makes log a no-op
+        flush_rows (int): buffered rows that trigger a flush
+    """
+    def __init__(self, path: str = None, enabled: bool = True, flush_rows: int = 50000):
+        self.path = path
+        self.enabled = enabled
+        self.flush_rows = flush_rows
+        self.buffer: list = [] #dicts of column arrays, one per log call
+        self.n_buffered = 0
+        self.chunks: list = [] #flushed DataFrames (in memory)
+        self.store = None #ColumnarStore of path; opened on the first flush
+
+    def __len__(self) -> int:
+        flushed = sum(self._store().meta.get('rows', [])) if self.path else sum(len(c) for c in self.chunks)
+        return self.n_buffered + flushed
+
+    def _store(self):
+        if self.store is None:
+            from storage import ColumnarStore #pyarrow is only needed for a log on disk
+            self.store = ColumnarStore(self.path, 'arrow')
+        return self.store
+
+    def log(self, event: str, month: int, location_id=-1, pid=-1, other_pid=-1, order_id='', amount=np.nan):
+        """
+        Records one event per element of the array arguments; scalars apply to all of them.
+
+        inpts:
+            event (str): one of EVENTS
+            month (int): realmc.month
+        """
+        if not self.enabled:
+            return
+        cols = {'location_id': location_id, 'pid': pid, 'other_pid': other_pid, 'order_id': order_id, 'amount': amount}
+        n = max([np.size(v) for v in cols.values() if np.ndim(v) > 0] + [0])
+        if n == 0:
+            return
+        batch = {'month': np.full(n, month, dtype=np.int64), 'event': np.full(n, event, dtype=object)}
+        for col, v in cols.items():
+            batch[col] = np.asarray(v, dtype=EVENT_COLS[col]) if np.ndim(v) > 0 else np.full(n, v, dtype=EVENT_COLS[col])
+        self.buffer.append(batch)
+        self.n_buffered += n
+        if self.n_buffered >= self.flush_rows:
+            self.flush()
+
+    def log_postings(self, event: str, month: int, amounts: np.ndarray):
+        """records a per location_id array of amounts (see Accounts.per_location); zero entries are left out"""
+        location_id = np.flatnonzero(amounts)
+        self.log(event, month, location_id=location_id, amount=np.asarray(amounts)[location_id])
+
+    def flush(self):
+        """moves the buffered events into one columnar chunk (in memory or a file in path)"""
+        if not self.buffer:
+            return
+        chunk = pd.DataFrame({col: np.concatenate([b[col] for b in self.buffer]) for col in EVENT_COLS})
+        self.buffer, self.n_buffered = [], 0
+        if self.path is None:
+            self.chunks.append(chunk)
+            return
+        store = self._store()
+        store.write(f'events_{len(store.tables()):06d}', chunk)
+        store.write_meta({'rows': store.meta.get('rows', []) + [len(chunk)]})
+
+    def to_frame(self) -> pd.DataFrame:
+        """returns every event logged so far, in order"""
+        self.flush()
+        chunks = self.chunks
+        if self.path is not None and self._store().tables():
+            chunks = [self._store().read(name) for name in self._store().tables()]
+        if not chunks:
+            return pd.DataFrame({col: np.empty(0, dtype=dt) for col, dt in EVENT_COLS.items()})
+        return pd.concat(chunks, ignore_index=True)
+
+    def query(self, events: list = None, begin_month: int = None, end_month: int = None) -> pd.DataFrame:
+        """returns the events of the given types (all if None) logged in [begin_month, end_month]"""
+        df = self.to_frame()
+        q1 = np.ones(len(df), dtype=bool)
+        if events is not None:
+            q1 &= df['event'].isin([events] if isinstance(events, str) else events).to_numpy()
+        if begin_month is not None:
+            q1 &= (df['month'] >= begin_month).to_numpy()
+        if end_month is not None:
+            q1 &= (df['month'] <= end_month).to_numpy()
+        return df.loc[q1].reset_index(drop=True)
+
+    def employee_deltas(self, begin_month: int = None, end_month: int = None) -> pd.DataFrame:
+        """the hires and fires of mm_employee_master (in place of diffing copies of it, see qa_test_MM)"""
+        return self.query(['hire', 'fire'], begin_month, end_month)[['month', 'event', 'location_id', 'pid', 'other_pid']]
+
+    def replay_balances(self, balance0: np.ndarray, begin_month: int = None, end_month: int = None) -> np.ndarray:
+        """
+        Replays the balance postings onto balance0.
+
+        inpts:
+            balance0 (np.ndarray): balance by location_id at the start of begin_month
+
+        opts:
+            the balance by location_id after the postings of end_month
+        """
+        postings = self.query(BALANCE_EVENTS, begin_month, end_month)
+        return balance0 + np.bincount(postings['location_id'], weights=postings['amount'], minlength=len(balance0))
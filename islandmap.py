@@ -0,0 +1,112 @@
+"""Memory-mapped, shared copy of the island layers."""
+###import dependencies
+import os
+import pickle
+import numpy as np
+
+META_FILE = 'meta.pkl'
+VERSION = 1 #bump when the layout of the map changes
+
+def map_dir(pickle_path: str) -> str:
+    """returns the folder of the map of pickle_path (island.pickle -> island_mm/)"""
+    return os.path.splitext(pickle_path)[0] + '_mm'
+
+def source_key(pickle_path: str) -> str:
+    """returns the size and mtime of pickle_path; None if it does not exist"""
+    try:
+        st = os.stat(pickle_path)
+    except OSError:
+        return None
+    return f'{st.st_size}:{st.st_mtime_ns}'
+
+def save(isle: dict, path: str, key: str):
+    """
+    Writes the arrays of isle to path as .npy files and the rest of isle to META_FILE.
+        -each file is written to a temp name and moved into place; META_FILE goes last, so a
+            reader that finds a matching key finds complete layers
+    """
+    os.makedirs(path, exist_ok=True)
+    layers, other = [], {}
+    for name, value in isle.items():
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            tmp = os.path.join(path, f'{name}.npy.{os.getpid()}.tmp')
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(value))
+            os.replace(tmp, os.path.join(path, f'{name}.npy'))
+            layers.append(name)
+        else:
+            other[name] = value
+
+    meta = {'version': VERSION, 'key': key, 'order': list(isle), 'layers': layers, 'other': other}
+    tmp = os.path.join(path, f'{META_FILE}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, os.path.join(path, META_FILE))
+
+def open_map(path: str, key: str = None, mode: str = 'r') -> dict:
+    """
+    Opens the map at path.
+
+    inpts:
+        path (str): folder written by save
+        key (str): source_key the map must have been built from; None accepts any map
+        mode (str): mmap_mode of the layers; 'r' read only, 'c' copy-on-write
+
+    opts:
+        isle dict with the layers as np.memmap, in the order of the original isle; None if the map
+            is missing, unreadable or stale
+    """
+    try:
+        with open(os.path.join(path, META_FILE), 'rb') as f:
+            meta = pickle.load(f)
+        if meta.get('version') != VERSION or (key is not None and meta.get('key') != key):
+            return None
+        isle = dict(meta['other'])
+        for name in meta['layers']:
+            isle[name] = np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode)
+    except (OSError, EOFError, ValueError, KeyError, pickle.UnpicklingError):
+        return None
+    return {name: isle[name] for name in meta['order']}
+
+def load(pickle_path: str, loader, cache: bool = True):
+    """
+    Returns the island of pickle_path with its layers memory mapped, building the map with loader the first time
+        (or when island.pickle changed).
+
+    inpts:
+        pickle_path (str): datadir + 'island.pickle'
+        loader (function): island.LoadIsland; only called when the map has to be built
+        cache (bool): read and write the map; if False (or the datadir is read only, or loader does not return a dict)
+            the island from loader is returned as it is
+
+    opts:
+        isle
+    """
+    path, key = map_dir(pickle_path), source_key(pickle_path)
+    if cache:
+        isle = open_map(path, key)
+        if isle is not None:
+            return isle
+
+    isle = loader(pickle_path)
+    if not cache or not isinstance(isle, dict):
+        return isle
+    try:
+        save(isle, path, key)
+    except OSError:
+        return isle
+    return open_map(path, key) or isle #drop the unpickled copy for the shared one
+
+def canvas(isle: dict, layer: str = 'raw') -> np.ndarray:
+    """
+    Returns a writable view of isle[layer] to draw on (e.g. location overlays) without touching the shared map;
+        pages are only copied when they are written. A layer that is not mapped is copied.
+    """
+    arr = isle[layer]
+    if isinstance(arr, np.memmap) and arr.filename is not None:
+        return np.load(arr.filename, mmap_mode='c')
+    return np.array(arr)
+
+def shared(isle: dict) -> dict:
+    """returns a copy.deepcopy memo that keeps the mapped layers of isle shared instead of copied"""
+    return {id(v): v for v in isle.values() if isinstance(v, np.memmap)}
@@ -0,0 +1,186 @@
+"""Numpy and optional numba kernels for the books, payroll and employee checks, selected by mm_params['backend']."""
+###import dependencies
+import os
+import time
+import types
+import warnings
+import numpy as np
+import pandas as pd
+
+BACKENDS = ('numpy', 'numba')
+
+#numpy kernels
+def per_location(keys: np.ndarray, amounts: np.ndarray, n: int) -> np.ndarray:
+    """sums amounts (no nan) per key into at least n bins; keys -1 are dropped"""
+    q1 = keys >= 0
+    return np.bincount(keys[q1], weights=amounts[q1], minlength=n)
+
+def scatter_add(target: np.ndarray, values: np.ndarray, keys: np.ndarray):
+    """target += values[keys], in place (a posting per location_id onto the rows of each location)"""
+    target += values[keys]
+
+def add_at(target: np.ndarray, pos: np.ndarray, values: np.ndarray):
+    """adds values to target at pos, in place; pos -1 are dropped and repeated pos add up"""
+    q1 = pos >= 0
+    np.add.at(target, pos[q1], values[q1])
+
+def distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """row wise euclidean distance of two (n, 2) arrays; nan where either is nan"""
+    return np.linalg.norm(a - b, axis=1)
+
+def cit(period_income: np.ndarray, rate: float, taxed: np.ndarray) -> np.ndarray:
+    """CIT of each mm_books row: max(0, period_income * rate) where taxed, else 0"""
+    tax = np.maximum(0.0, period_income * rate)
+    tax[~taxed] = 0.0
+    return tax
+
+NUMPY = types.SimpleNamespace(name='numpy', per_location=per_location, scatter_add=scatter_add, add_at=add_at,
+                              distance=distance, cit=cit)
+
+#loops for numba.njit; the same arithmetic in the same order as the numpy kernels
+def _per_location_loop(keys, amounts, n):
+    for i in range(len(keys)):
+        if keys[i] >= n:
+            n = keys[i] + 1
+    out = np.zeros(n)
+    for i in range(len(keys)):
+        if keys[i] >= 0:
+            out[keys[i]] += amounts[i]
+    return out
+
+def _scatter_add_loop(target, values, keys):
+    for i in range(len(keys)):
+        target[i] += values[keys[i]]
+
+def _add_at_loop(target, pos, values):
+    for i in range(len(pos)):
+        if pos[i] >= 0:
+            target[pos[i]] += values[i]
+
+def _distance_loop(a, b):
+    out = np.empty(len(a))
+    for i in range(len(a)):
+        dv, dh = a[i, 0] - b[i, 0], a[i, 1] - b[i, 1]
+        out[i] = np.sqrt(dv*dv + dh*dh)
+    return out
+
+def _cit_loop(period_income, rate, taxed):
+    out = np.zeros(len(period_income))
+    for i in range(len(period_income)):
+        v = period_income[i] * rate
+        if taxed[i] and (v > 0.0 or v != v): #np.maximum keeps nan
+            out[i] = v
+    return out
+
+_NUMBA = None #the numba backend once compiled; False if numba is not installed
+_WARNED = False #the numpy fallback was warned about
+
+def _numba():
+    """compiles the numba backend on first use; None if numba is not installed"""
+    global _NUMBA
+    if _NUMBA is None:
+        try:
+            import numba
+        except ImportError:
+            _NUMBA = False
+            return None
+        jit = numba.njit(cache=True)
+        loops = {name: jit(f) for name, f in [('per_location', _per_location_loop), ('scatter_add', _scatter_add_loop),
+                 ('add_at', _add_at_loop), ('distance', _distance_loop), ('cit', _cit_loop)]}
+        ints = lambda x: np.ascontiguousarray(x, dtype=np.int64)
+        floats = lambda x: np.ascontiguousarray(x, dtype=float)
+        _NUMBA = types.SimpleNamespace(
+            name='numba',
+            per_location=lambda keys, amounts, n: loops['per_location'](ints(keys), floats(amounts), n),
+            scatter_add=lambda target, values, keys: loops['scatter_add'](target, floats(values), ints(keys)),
+            add_at=lambda target, pos, values: loops['add_at'](target, ints(pos), floats(values)),
+            distance=lambda a, b: loops['distance'](floats(a), floats(b)),
+            cit=lambda period_income, rate, taxed: loops['cit'](floats(period_income), float(rate), np.ascontiguousarray(taxed, dtype=bool)),
+        )
+    return _NUMBA or None
+
+def backend(realmc) -> types.SimpleNamespace:
+    """returns the kernels of realmc.mm_params['backend'] (see BACKENDS); numpy if it is not set or numba is not installed"""
+    name = realmc.mm_params.get('backend', 'numpy')
+    if name == 'numpy':
+        return NUMPY
+    if name == 'numba':
+        global _WARNED
+        kernels = _numba()
+        if kernels is None and not _WARNED:
+            warnings.warn("mm_params['backend'] is 'numba' but numba is not installed (pip install numba); using the numpy kernels")
+            _WARNED = True
+        return kernels or NUMPY
+    raise ValueError(f"unknown mm_params['backend'] {name}; expected one of {BACKENDS}")
+
+def available(name: str) -> bool:
+    """True if the kernels of backend name can run here (numba is installed for 'numba')"""
+    if name not in BACKENDS:
+        raise ValueError(f'unknown backend {name}; expected one of {BACKENDS}')
+    return name == 'numpy' or _numba() is not None
+
+def check_kernels(name: str = 'numba', n: int = 10000, seed: int = 0):
+    """
+    Runs each kernel of backend name and of the numpy backend on the same random arrays (with -1 keys,
+        repeated keys and nan) and asserts the results are identical.
+    """
+    if not available(name):
+        raise ImportError(f'the {name} backend is not available here (pip install {name})')
+    k = {'numpy': NUMPY, 'numba': _numba()}[name]
+    rng = np.random.default_rng(seed)
+    n_loc = 50
+    keys = rng.integers(-1, n_loc, n)
+    amounts = np.round(rng.normal(0, 1000, n), 2)
+    a, b = rng.normal(0, 100, (n, 2)), rng.normal(0, 100, (n, 2))
+    b[::97] = np.nan
+    income = rng.normal(0, 1000, n_loc)
+    rows = rng.integers(0, n_loc, n)
+    taxed = rng.random(n) < 0.8
+    period_income = rng.normal(0, 1000, n)
+    period_income[::89] = np.nan
+
+    np.testing.assert_array_equal(k.per_location(keys, amounts, n_loc), NUMPY.per_location(keys, amounts, n_loc))
+    np.testing.assert_array_equal(k.distance(a, b), NUMPY.distance(a, b))
+    np.testing.assert_array_equal(k.cit(period_income, 0.22, taxed), NUMPY.cit(period_income, 0.22, taxed))
+    for f, args in (('scatter_add', (income, rows)), ('add_at', (keys, amounts))):
+        got, want = np.zeros(n if f == 'scatter_add' else n_loc), np.zeros(n if f == 'scatter_add' else n_loc)
+        getattr(k, f)(got, *args)
+        getattr(NUMPY, f)(want, *args)
+        np.testing.assert_array_equal(got, want)
+
+def compare_backends(realmc, months: int = 1, seed: int = 0, backends: tuple = BACKENDS) -> dict:
+    """
+    Equivalence harness: runs EvolveMM for months from the same state of realmc (copied per backend, seeded with seed)
+        on each backend and asserts the books are identical to those of the first backend.
+        -a backend that is not available here (see available) raises ImportError instead of being compared
+        -mm_books, mm_location_master, mm_employee_master and persondf.savings are compared exactly
+        -archive_path and events_path are given a subdirectory per backend
+        -realmc itself is not changed
+
+    opts:
+        dict of backend : seconds of EvolveMM
+    """
+    import scenarios
+    missing = [name for name in backends if not available(name)]
+    if missing:
+        raise ImportError(f'backends {missing} are not available here (pip install {" ".join(missing)})')
+    runs, seconds = {}, {}
+    for name in backends:
+        E = scenarios.copy_realm(realmc)
+        E.mm_params['backend'] = name
+        E.mm_params['dbug'] = False
+        for key in ('archive_path', 'events_path'):
+            if E.mm_params.get(key) is not None:
+                E.mm_params[key] = os.path.join(E.mm_params[key], f'backend_{name}')
+        np.random.seed(seed)
+        t0 = time.perf_counter()
+        E.EvolveMM(months, 0, 0)
+        seconds[name] = time.perf_counter() - t0
+        runs[name] = E
+
+    first = runs[backends[0]]
+    for name in backends[1:]:
+        for tbl in ('mm_books', 'mm_location_master', 'mm_employee_master'):
+            pd.testing.assert_frame_equal(first.mm_dfs[tbl], runs[name].mm_dfs[tbl], check_exact=True, obj=f'{tbl} ({name})')
+        pd.testing.assert_series_equal(first.persondf['savings'], runs[name].persondf['savings'], check_exact=True, obj=f'savings ({name})')
+    return seconds
@@ -0,0 +1,104 @@
+"""Manufacturing queue of accepted orders, bucketed by completion month with per-location capacity."""
+###import dependencies
+import numpy as np
+
+class ManufacturingQueue:
+    """
+    Buckets of queued orders by the month they complete (due).
+        -an entry is (tag, rows): rows are positions within whatever tag names (an OrderLedger chunk,
+            the slots of an MMProjection, ...)
+        -each location completes at most capacity[location_id] orders per month; an order that does not fit
+            in its due month waits for the first month with room, up to max_delay months, and is rejected otherwise
+        -location_id -1 (products not made at a location) and a capacity of inf/nan are not limited
+
+    inpts:
+        capacity (np.ndarray): orders per month by location_id; None for no limits
+        max_delay (int): months an order may wait for capacity before it is rejected
+    """
+    def __init__(self, capacity: np.ndarray = None, max_delay: int = 0):
+        self.buckets: dict = {} #due month : list of (tag, rows)
+        self.load: dict = {} #due month : orders due per location_id
+        self.set_capacity(capacity, max_delay)
+
+    def __len__(self) -> int:
+        return sum(len(rows) for entries in self.buckets.values() for tag, rows in entries)
+
+    def set_capacity(self, capacity: np.ndarray = None, max_delay: int = 0):
+        """sets the limits for orders scheduled from now on"""
+        self.capacity = None if capacity is None else np.where(np.isnan(capacity), np.inf, capacity)
+        self.max_delay = max_delay
+
+    def _load(self, due: int) -> np.ndarray:
+        if due not in self.load:
+            self.load[due] = np.zeros(len(self.capacity))
+        return self.load[due]
+
+    def insert(self, tag, rows: np.ndarray, due: np.ndarray, loc: np.ndarray = None):
+        """queues rows at the given due months as they are (no capacity check); they count towards the load"""
+        rows, due = np.asarray(rows), np.asarray(due, dtype=np.int64)
+        for d in np.unique(due):
+            q1 = due == d
+            self.buckets.setdefault(int(d), []).append((tag, rows[q1]))
+            if self.capacity is not None and loc is not None:
+                l = loc[q1]
+                np.add.at(self._load(int(d)), l[l >= 0], 1)
+
+    def schedule(self, tag, rows: np.ndarray, start: int, status: np.ndarray, loc: np.ndarray = None) -> np.ndarray:
+        """
+        Queues newly accepted orders.
+
+        inpts:
+            tag: what rows are positions into
+            rows (np.ndarray): the orders' positions
+            start (int): the month they are accepted; an order with status s is due start + s
+            status (np.ndarray): order_status on acceptance (manufacture_time); orders with status <= 0 or nan are not queued
+            loc (np.ndarray): location_id making each order; -1 if none
+
+        opts:
+            the orders' statuses: unchanged, increased by the months waited for capacity, or -1 if rejected
+        """
+        status = np.asarray(status, dtype=float).copy()
+        rows = np.asarray(rows)
+        queued = status > 0
+        if self.capacity is None or loc is None:
+            self.insert(tag, rows[queued], start + status[queued])
+            return status
+
+        loc = np.asarray(loc)
+        due = np.where(queued, start + np.nan_to_num(status), 0).astype(np.int64)
+        free = queued & ((loc < 0) | np.isinf(self.capacity[np.maximum(loc, 0)]))
+        self.insert(tag, rows[free], due[free]) #unlimited orders do not count towards the load
+        waiting = np.flatnonzero(queued & ~free)
+
+        #first come, first served, in row order; orders of a location that has room for all of them in their due
+        #   month are queued at once, the orders of a full location take the first month with room one by one
+        d, l, w = due[waiting], loc[waiting], waiting
+        order = np.lexsort((w, l, d))
+        d, l, w = d[order], l[order], w[order]
+        first = np.r_[True, (d[1:] != d[:-1]) | (l[1:] != l[:-1])]
+        rank = np.arange(len(w)) - np.maximum.accumulate(np.where(first, np.arange(len(w)), 0)) #position within (due, location)
+        used = np.empty(len(w))
+        for x in np.unique(d):
+            q1 = d == x
+            used[q1] = self._load(int(x))[l[q1]]
+        full = np.isin(l, l[used + rank >= self.capacity[l]])
+        self.insert(tag, rows[w[~full]], d[~full], l[~full])
+
+        for i in np.sort(w[full]):
+            for delay in range(self.max_delay + 1):
+                load = self._load(int(due[i]) + delay)
+                if load[loc[i]] < self.capacity[loc[i]]:
+                    self.insert(tag, rows[i:i + 1], [due[i] + delay], loc[i:i + 1])
+                    status[i] += delay
+                    break
+            else:
+                status[i] = -1 #no room within max_delay months: order_rejected
+        return status
+
+    def pop(self, month: int) -> list:
+        """removes and returns the (tag, rows) entries due in month"""
+        self.load.pop(month, None)
+        return self.buckets.pop(month, [])
+
+    def clear(self):
+        self.buckets, self.load = {}, {}
@@ -0,0 +1,267 @@
+"""Append-only, month-chunked order ledger used in place of the mm_order_master DataFrame."""
+###import dependencies
+import numpy as np
+import pandas as pd
+from manufacturing import ManufacturingQueue
+
+class OrderLedger:
+    """
+    Stores mm_order_master as one columnar chunk per order_date.
+        -order_ids are indexed so duplicates are rejected without rehashing the history
+        -accepted orders in production are queued by the month they complete (see manufacturing.py), so
+            advance only touches the orders completed that month; the order_status of the other open orders
+            is counted down lazily (settle) when the ledger is read
+        -months that still hold open orders (order_status > 0) are tracked so reads only touch active chunks
+        -closed months can be spilled to an archive (see spill, archive.py); reads of those months go to the archive
+
+    inpts:
+        orders (pd.DataFrame): an initial mm_order_master (may be empty); its statuses are taken as of clock
+        clock (int): the month the ledger was last advanced to (realmc.month); None to use each order's order_date
+    """
+    def __init__(self, orders: pd.DataFrame = None, clock: int = None):
+        self.chunks: dict = {} #order_date : DataFrame of the orders placed that month
+        self.ids: set = set() #index of every order_id ever accepted
+        self.open_months: set = set() #order_dates of chunks with at least one open order
+        self.columns = None if orders is None else orders.columns
+        self.clock = clock
+        self.queue = ManufacturingQueue()
+        self.prod_loc: np.ndarray = None #location_id making each product_code; set by set_capacity
+        self.due: dict = {} #order_date : month each row of the chunk completes (nan if not in production)
+        self.n_open: dict = {} #order_date : rows of the chunk in production
+        self._settled = clock #clock the order_status columns were last counted down to
+        self.archive = None #archive.Archive holding the spilled months
+        self.archived: set = set() #order_dates of the chunks spilled to the archive
+        if orders is not None and len(orders) > 0:
+            self.append(orders, schedule=False)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _empty(self) -> pd.DataFrame:
+        """returns an empty frame with the ledger's columns"""
+        return pd.DataFrame(columns=self.columns)
+
+    def _loc(self, chunk: pd.DataFrame) -> np.ndarray:
+        """location_id making each order of chunk; None if the ledger has no capacities"""
+        if self.prod_loc is None or 'product_code' not in chunk.columns:
+            return None
+        code = chunk['product_code'].to_numpy()
+        return np.where(code >= 0, self.prod_loc[np.maximum(code, 0)], -1)
+
+    def _track(self, month: int, due: np.ndarray):
+        """appends the due months of new rows of chunk month and updates its open count"""
+        self.due[month] = np.concatenate([self.due.get(month, np.empty(0)), due])
+        self.n_open[month] = self.n_open.get(month, 0) + int(np.isfinite(due).sum())
+        if self.n_open[month] > 0:
+            self.open_months.add(month)
+        else:
+            self.open_months.discard(month)
+
+    def _archived(self, month: int) -> pd.DataFrame:
+        """reads the spilled chunk of month back from the archive"""
+        return self.archive.read_partition('mm_order_master', month).reset_index(drop=True)
+
+    def _restore(self, month: int):
+        """moves the spilled chunk of month back into memory (late orders for that month)"""
+        self.chunks[month] = self._archived(month)
+        self.due[month], self.n_open[month] = np.full(len(self.chunks[month]), np.nan), 0
+        self.archived.discard(month)
+
+    def _start(self, month: int) -> int:
+        """month from which a new order of month counts down"""
+        return month if self.clock is None else max(month, self.clock)
+
+    def set_capacity(self, prod_loc: np.ndarray, capacity: np.ndarray, max_delay: int):
+        """
+        Limits the orders each location completes per month (see ManufacturingQueue) for orders appended from now on.
+
+        inpts:
+            prod_loc (np.ndarray): location_id making each product_code; -1 if none
+            capacity (np.ndarray): orders per month by location_id
+            max_delay (int): months an order may wait for capacity before it is rejected
+        """
+        self.prod_loc = prod_loc
+        self.queue.set_capacity(capacity, max_delay)
+        self.requeue(self.open_months)
+
+    def append(self, orders: pd.DataFrame, schedule: bool = True) -> pd.DataFrame:
+        """
+        Adds new orders to the ledger; orders whose order_id is already in the ledger are rejected.
+
+        inpts:
+            orders (pd.DataFrame): orders following the data standards of mm_order_master
+            schedule (bool): queue the orders for manufacturing under the capacity limits, which may delay
+                (order_status increased) or reject (order_status = -1) them; False queues them with their order_status as is
+
+        opts:
+            the orders that were added, as stored (with their queued order_status)
+        """
+        if self.columns is None:
+            self.columns = orders.columns
+
+        #reject order_ids already in the ledger (and repeats within the batch)
+        is_new = np.fromiter((oid not in self.ids for oid in orders['order_id']), dtype=bool, count=len(orders))
+        new_orders = orders.loc[is_new].drop_duplicates(subset='order_id')
+        if len(new_orders) == 0:
+            return new_orders
+
+        self.settle()
+        added = []
+        for month, chunk in new_orders.groupby('order_date', sort=False):
+            chunk = chunk.reset_index(drop=True)
+            if month in self.archived:
+                self._restore(month)
+            offset = len(self.chunks[month]) if month in self.chunks else 0
+            rows = np.arange(offset, offset + len(chunk))
+            status = chunk['order_status'].to_numpy(dtype=float)
+            start = self._start(month)
+            if schedule:
+                queued = self.queue.schedule(month, rows, start, status, self._loc(chunk))
+                if not np.array_equal(queued, status, equal_nan=True): #delayed or rejected
+                    chunk['order_status'] = queued.astype(chunk['order_status'].dtype) if not np.isnan(queued).any() else queued
+                    status = queued
+            else:
+                q1 = status > 0
+                loc = self._loc(chunk)
+                self.queue.insert(month, rows[q1], start + status[q1], None if loc is None else loc[q1])
+
+            added.append(chunk)
+            if month in self.chunks: #late arrivals for a month already stored
+                chunk = pd.concat([self.chunks[month], chunk], ignore_index=True)
+            self.chunks[month] = chunk
+            self._track(month, np.where(status > 0, start + status, np.nan))
+
+        self.ids.update(new_orders['order_id'])
+        return pd.concat(added, ignore_index=True)
+
+    def requeue(self, months, clock: int = None):
+        """
+        Rebuilds the manufacturing queue for the chunks of months from their order_status columns,
+            taken as of clock (default: the ledger's clock); used after statuses were written from outside
+            (set_capacity, MMProjection.flush). Chunks of other months must not be in production.
+        """
+        if clock is not None:
+            self.clock = self._settled = clock
+        else:
+            self.settle()
+        self.queue.clear()
+        for m in sorted(months):
+            chunk = self.chunks[m]
+            status = chunk['order_status'].to_numpy(dtype=float)
+            q1 = status > 0
+            start = self._start(m)
+            loc = self._loc(chunk)
+            self.queue.insert(m, np.flatnonzero(q1), start + status[q1], None if loc is None else loc[q1])
+            self.due[m], self.n_open[m] = np.empty(0), 0
+            self._track(m, np.where(q1, start + status, np.nan))
+
+    def settle(self):
+        """counts the order_status of the open orders down to the clock"""
+        if self.clock is None or self._settled == self.clock:
+            return
+        for m in self.open_months:
+            chunk, due = self.chunks[m], self.due[m]
+            q1 = np.isfinite(due)
+            status = chunk['order_status'].to_numpy(dtype=float).copy()
+            status[q1] = due[q1] - self.clock
+            chunk['order_status'] = status.astype(chunk['order_status'].dtype)
+        self._settled = self.clock
+
+    def spill(self, archive, before: int) -> int:
+        """
+        Moves the chunks placed before month before that have no order in production to archive.
+
+        inpts:
+            archive (archive.Archive): where the chunks are written; also where they are read back from
+            before (int): first month kept in memory
+
+        opts:
+            the number of orders spilled
+        """
+        months = sorted(m for m in self.chunks if m < before and m not in self.open_months)
+        if not months:
+            return 0
+        self.settle()
+        self.archive = archive
+        n = 0
+        for m in months:
+            archive.write('mm_order_master', self.chunks[m])
+            n += len(self.chunks.pop(m))
+            del self.due[m], self.n_open[m]
+        self.archived.update(months)
+        return n
+
+    def missing(self, order_ids) -> list:
+        """returns the order_ids that are not in the ledger"""
+        return [oid for oid in order_ids if oid not in self.ids]
+
+    def month(self, month: int) -> pd.DataFrame:
+        """returns the chunk of orders placed in month (not a copy, unless it is read from the archive)"""
+        self.settle()
+        if month in self.archived:
+            return self._archived(month)
+        return self.chunks.get(month, self._empty())
+
+    def between(self, begin_month: int = None, end_month: int = None, archived: bool = True) -> pd.DataFrame:
+        """
+        returns the orders placed in [begin_month, end_month] (None: no bound); spilled months are read
+            from the archive unless archived is False
+        """
+        self.settle()
+        months = self.chunks.keys() | (self.archived if archived else set())
+        months = sorted(m for m in months if (begin_month is None or m >= begin_month) and (end_month is None or m <= end_month))
+        chunks = [self.chunks[m] if m in self.chunks else self._archived(m) for m in months]
+        return pd.concat(chunks, ignore_index=True) if chunks else self._empty()
+
+    def open_orders(self) -> pd.DataFrame:
+        """returns the orders still in production (order_status > 0)"""
+        self.settle()
+        chunks = [self.chunks[m].loc[self.chunks[m]['order_status'] > 0] for m in sorted(self.open_months)]
+        return pd.concat(chunks, ignore_index=True) if chunks else self._empty()
+
+    def active(self, month: int) -> pd.DataFrame:
+        """returns the orders that mm_operations works on: orders placed in month and orders still in production"""
+        self.settle()
+        months = sorted(self.open_months | ({month} & self.chunks.keys()))
+        chunks = [
+            self.chunks[m].loc[(self.chunks[m]['order_date'] == month) | (self.chunks[m]['order_status'] > 0)]
+            for m in months
+        ]
+        return pd.concat(chunks, ignore_index=True) if chunks else self._empty()
+
+    def n_active(self, month: int) -> int:
+        """the number of rows active(month) would return, counted from the open counts without reading the chunks"""
+        placed = len(self.chunks[month]) - self.n_open[month] if month in self.chunks else 0
+        return sum(self.n_open[m] for m in self.open_months) + placed
+
+    def advance(self, month: int) -> pd.DataFrame:
+        """
+        Progresses the orders in production one month; only the orders due this month are touched.
+
+        inpts:
+            month (int): the current month
+
+        opts:
+            the orders that completed (order_status reached 0) this month, in ledger order
+        """
+        self.clock = month
+        done = {}
+        for m, rows in self.queue.pop(month):
+            done.setdefault(m, []).append(rows)
+
+        completed = []
+        for m in sorted(done):
+            rows = np.sort(np.concatenate(done[m]))
+            chunk = self.chunks[m]
+            chunk.iloc[rows, chunk.columns.get_loc('order_status')] = 0 #order_complete
+            self.due[m][rows] = np.nan
+            self.n_open[m] -= len(rows)
+            if self.n_open[m] == 0:
+                self.open_months.discard(m)
+            completed.append(chunk.iloc[rows])
+
+        return pd.concat(completed, ignore_index=True) if completed else self._empty()
+
+    def to_frame(self, archived: bool = True) -> pd.DataFrame:
+        """materializes the full order history as a mm_order_master DataFrame; archived=False leaves out spilled months"""
+        return self.between(archived=archived)
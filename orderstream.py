@@ -0,0 +1,92 @@
+"""Monthly qa_simulate_orders batches drawn from a per-month seeded numpy Generator."""
+###import dependencies
+import numpy as np
+import pandas as pd
+import catalog
+
+ORDER_COLS = ['order_id', 'product_id', 'product_quantity', 'order_date', 'ship_to', 'ship_by', 'account_receivable', 'order_status']
+
+class OrderStream:
+    """
+    Generates the simulated B2B orders month by month, following initf.simulate_orders:
+        -product_id drawn uniformly from the price list (qa_sandbox_orders.csv)
+        -product_quantity = round(N(50, 10) * xbar_order_size / 50)
+        -order_status = manufacture_time from mm_product_master; ship_by = month + manufacture_time of the price list
+        -account_receivable = product_quantity * sell price
+    The draws for a month only depend on (order_seed, month, draw), so runs are reproducible and any month can be
+        generated on its own, in any order; order_ids keep counting up from the last one handed out.
+
+    inpts:
+        realmc (class Realm obj): E, after mm_codes is built; folderpath and mm_params
+            ('order_seed', 'n_orders', 'xbar_order_size') are read when a batch is drawn
+        last_order_id (str): the last order_id already used (e.g. the last row of qa_sandbox_orders); None to start at o000001
+    """
+    def __init__(self, realmc, last_order_id: str = None):
+        self.realmc = realmc
+        self.next_id = int(last_order_id.lstrip('o') or 0) + 1 if last_order_id else 1
+        self.product_ids = None #price list as arrays; loaded on the first batch
+
+    def _load(self):
+        """takes the price list from the catalog once and lines up mm_product_master.manufacture_time with it"""
+        realmc = self.realmc
+        if realmc.mm_catalog is None:
+            realmc.mm_catalog = catalog.load(realmc.folderpath)
+        prices = realmc.mm_catalog.prices
+        self.product_ids = prices['product_id'].to_numpy(dtype=object)
+        self.sell_price = prices['sell price'].to_numpy(dtype=float)
+        self.ship_time = prices['manufacture_time'].to_numpy()
+
+        #manufacture_time of mm_product_master, in price list order; nan for products not manufactured
+        product_master = realmc.mm_dfs['mm_product_master']
+        code = realmc.mm_codes.encode(prices['product_id'], 'product_id')
+        times = np.full(len(realmc.mm_codes.products), np.nan)
+        times[product_master['product_code'].to_numpy()] = product_master['manufacture_time'].to_numpy()
+        self.status = np.where(code >= 0, times[code], np.nan)
+        if not np.isnan(self.status).any():
+            self.status = self.status.astype(np.int64)
+
+    def rng(self, month: int, draw: int = 0) -> np.random.Generator:
+        """returns the Generator for (mm_params['order_seed'], month, draw)"""
+        return np.random.default_rng([self.realmc.mm_params['order_seed'], month, draw])
+
+    def draw(self, month: int, draw: int = 0) -> dict:
+        """
+        Generates the orders placed in month as arrays.
+
+        inpts:
+            month (int): order_date of the batch
+            draw (int): independent draws within the same month (e.g. the opening orders of InitializeMM)
+
+        opts:
+            a dict of ORDER_COLS : array (order_date and ship_to are scalars) of n_orders orders
+        """
+        if self.product_ids is None:
+            self._load()
+        n = self.realmc.mm_params['n_orders']
+        rng = self.rng(month, draw)
+        p = rng.integers(len(self.product_ids), size=n) #products ordered
+        quantity = np.round(rng.normal(50, 10, n) * self.realmc.mm_params['xbar_order_size'] / 50).astype(int)
+
+        ids = np.arange(self.next_id, self.next_id + n)
+        self.next_id += n
+        return {
+            'order_id': np.char.add('o', np.char.zfill(ids.astype(str), 6)).astype(object),
+            'product_id': self.product_ids[p],
+            'product_quantity': quantity,
+            'order_date': month,
+            'order_status': self.status[p],
+            'ship_to': 'qa_simulate_orders',
+            'ship_by': self.ship_time[p] + month,
+            'account_receivable': quantity * self.sell_price[p],
+        }
+
+    def batch(self, month: int, draw: int = 0) -> pd.DataFrame:
+        """returns the orders placed in month (see draw) as a DataFrame following the data standards of mm_order_master"""
+        return pd.DataFrame(self.draw(month, draw), columns=ORDER_COLS)
+
+    def batches(self, start_month: int, n_months: int = None):
+        """yields the monthly batches from start_month on (forever if n_months is None)"""
+        month = start_month
+        while n_months is None or month < start_month + n_months:
+            yield self.batch(month)
+            month += 1
@@ -0,0 +1,82 @@
+"""Pays mm_employee_master into persondf.savings through a cached pid -> row index."""
+###import dependencies
+import numpy as np
+import pandas as pd
+import kernels
+
+class Payroll:
+    """
+    Pays mm_employee_master out of the location balances into persondf.savings.
+        -positions: row position in persondf of each employee (-1 if the pid is not in persondf);
+            rebuilt only when the employees' pids or persondf's rows change (checked on the employees only)
+        -an employee listed at two locations is paid by both
+
+    inpts:
+        realmc (class Realm obj): E, after mm_accounts is built
+    """
+    def __init__(self, realmc):
+        self.realmc = realmc
+        self.pids: np.ndarray = None #employee pids the positions were built for
+        self.pos: np.ndarray = None
+        self.rows: np.ndarray = None #distinct persondf rows of the employees that were found
+        self.inv: np.ndarray = None #index into rows of each found employee
+        self.loc: np.ndarray = None #location_id of each employee
+        self.persondf = None #the persondf the positions point into
+
+    def _stale(self, pids: np.ndarray) -> bool:
+        """True if the positions no longer point at the employees' rows"""
+        persondf = self.realmc.persondf
+        if self.pos is None or persondf is not self.persondf or not np.array_equal(pids, self.pids):
+            return True
+        found = self.pos >= 0
+        return self.pos.max(initial=-1) >= len(persondf) or not np.array_equal(persondf['pid'].to_numpy()[self.pos[found]], pids[found])
+
+    def positions(self) -> np.ndarray:
+        """returns the persondf row position of each employee, refreshing the index if needed"""
+        employees = self.realmc.mm_dfs['mm_employee_master']
+        pids = employees['pid'].to_numpy()
+        if self._stale(pids):
+            self.persondf = self.realmc.persondf
+            self.pids = pids.copy()
+            self.pos = pd.Index(self.persondf['pid']).get_indexer(pids)
+            self.rows, self.inv = np.unique(self.pos[self.pos >= 0], return_inverse=True) #rows paid; employee -> row
+        self.loc = employees['location_id'].to_numpy()
+        return self.pos
+
+    def wages(self) -> np.ndarray:
+        """this month's wage of each employee: employee_pay / 12 * (1 + np.random.rand(n)/10)"""
+        return (1 + np.random.rand(len(self.realmc.mm_dfs['mm_employee_master']))/10) * self.realmc.mm_params['employee_pay']/12
+
+    def credit(self, savings: np.ndarray, pay: np.ndarray) -> np.ndarray:
+        """adds pay to savings (an array over persondf rows) at the employees' positions"""
+        kernels.backend(self.realmc).add_at(savings, self.pos, pay)
+        return savings
+
+    def pay(self, mask: np.ndarray = None) -> np.ndarray:
+        """
+        Pays this month's wages: credited to persondf.savings, charged to mm_location_master.balance
+            and the open mm_books period_income of the employees' locations.
+
+        inpts:
+            mask (np.ndarray): by location_id; the employees of locations that are False are not paid
+                (their wages are still drawn, so np.random advances the same); None pays everyone
+
+        opts:
+            the wages paid by location_id
+        """
+        realmc = self.realmc
+        persondf = realmc.persondf
+        pos = self.positions()
+        pay = self.wages()
+        if mask is not None:
+            pay = np.where(mask[self.loc], pay, 0.0)
+
+        #add pay to savings; only the employees' rows are read and written (missing savings count as 0)
+        per_row = kernels.backend(realmc).per_location(self.inv, pay[pos >= 0], len(self.rows))
+        j = persondf.columns.get_loc('savings')
+        persondf.iloc[self.rows, j] = np.nan_to_num(persondf['savings'].to_numpy(dtype=float)[self.rows]) + per_row
+
+        #subtract from mm_location_master.balance and recognize expense in the latest mm_books.period_income
+        wages = realmc.mm_accounts.per_location(self.loc, pay)
+        realmc.mm_accounts.post(income=-wages)
+        return wages
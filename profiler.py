@@ -0,0 +1,117 @@
+"""Per-stage, per-month wall time, row counts and peak memory for Realm.EvolveMM."""
+###import dependencies
+import time
+import tracemalloc
+import pandas as pd
+
+class StageRecord:
+    """One timed stage; rows_in/rows_out can be set by the caller inside the with block"""
+    __slots__ = ('month', 'stage', 'rows_in', 'rows_out', 'seconds', 'peak_mem')
+
+    def __init__(self, month: int, stage: str, rows_in: int = None):
+        self.month = month
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = None
+        self.peak_mem = None #peak bytes allocated above the start of the stage
+
+class _NullStage:
+    """Shared no-op stage handed out while the profiler is off"""
+    month = stage = rows_in = rows_out = seconds = peak_mem = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass #ignore rows_out etc. set by the caller
+
+NULL_STAGE = _NullStage()
+
+class _Stage:
+    """Context manager that times one stage and appends its record to the profiler"""
+    __slots__ = ('profiler', 'record', 't0', 'mem0')
+
+    def __init__(self, profiler, record: StageRecord):
+        self.profiler = profiler
+        self.record = record
+
+    def __enter__(self) -> StageRecord:
+        if self.profiler.track_memory:
+            self.mem0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.t0 = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc):
+        self.record.seconds = time.perf_counter() - self.t0
+        if self.profiler.track_memory:
+            self.record.peak_mem = tracemalloc.get_traced_memory()[1] - self.mem0
+        self.profiler.records.append(self.record)
+        return False
+
+class StageProfiler:
+    """
+    Records named stages of each month of Realm.EvolveMM. Off by default; while off, stage() returns a shared no-op.
+
+    inpts:
+        enabled (bool): record stages
+        track_memory (bool): also record peak memory per stage with tracemalloc (slows the run down)
+
+    usage:
+        with realmc.mm_profiler.stage('mm_hr', realmc.month, rows_in=len(df)) as rec:
+            ...
+            rec.rows_out = len(out)
+    """
+    COLUMNS = ['month', 'stage', 'rows_in', 'rows_out', 'seconds', 'peak_mem']
+
+    def __init__(self, enabled: bool = False, track_memory: bool = False):
+        self.records: list = []
+        self.enabled = enabled
+        self.track_memory = track_memory
+
+    @property
+    def track_memory(self) -> bool:
+        return self._track_memory
+
+    @track_memory.setter
+    def track_memory(self, value: bool):
+        self._track_memory = value
+        if value and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name: str, month: int = None, rows_in: int = None):
+        """returns a context manager timing the stage name"""
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self, StageRecord(month, name, rows_in))
+
+    def reset(self):
+        """drops all records"""
+        self.records = []
+
+    def to_frame(self) -> pd.DataFrame:
+        """returns the records as a DataFrame, one row per stage per month"""
+        return pd.DataFrame([[getattr(r, c) for c in self.COLUMNS] for r in self.records], columns=self.COLUMNS)
+
+    def report(self) -> pd.DataFrame:
+        """returns total and mean time, rows and peak memory per stage, slowest stage first"""
+        return self.to_frame().groupby('stage').agg(
+                months=('month', 'nunique'),
+                total_seconds=('seconds', 'sum'),
+                mean_seconds=('seconds', 'mean'),
+                rows_in=('rows_in', 'sum'),
+                rows_out=('rows_out', 'sum'),
+                max_peak_mem=('peak_mem', 'max')
+            ).sort_values('total_seconds', ascending=False).reset_index()
+
+    def to_csv(self, path: str):
+        """writes the records to a csv"""
+        self.to_frame().to_csv(path, index=False)
+
+    def to_json(self, path: str):
+        """writes the records to a json file (list of records)"""
+        self.to_frame().to_json(path, orient='records', indent=1)
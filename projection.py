@@ -0,0 +1,280 @@
+"""MM-only multi-month projection in arrays with the population frozen (Realm.ProjectMM)."""
+###import dependencies
+import numpy as np
+import pandas as pd
+import operations as ops
+import archive
+from orderstream import ORDER_COLS
+from manufacturing import ManufacturingQueue
+
+#array name : dtype of the per-order arrays
+ORDER_ARRAYS = {
+    'order_date': np.int64,
+    'product_code': np.int64,
+    'product_quantity': float,
+    'order_status': float,
+    'profit': float,
+    'sales_tax': float,
+}
+
+class MMProjection:
+    """
+    Holds the MM state of a Realm as arrays while it is projected.
+        -orders: one slot per order (ledger chunks that can still change first, then the orders recieved
+            during the projection); queue holds the slots in production by due month, due their due month
+        -savings: persondf.savings; employees are paid into it by row position
+
+    inpts:
+        realmc (class Realm obj): E, after InitializeMM (or ReadAll of an MM checkpoint)
+        schedule (pd.DataFrame): optional population changes; columns month, pid and the persondf columns
+            to set (e.g. death, locv, loch); a row is applied when realmc.month reaches its month
+    """
+    def __init__(self, realmc, schedule: pd.DataFrame = None):
+        self.realmc = realmc
+        self.schedule = {} if schedule is None else dict(tuple(schedule.groupby('month')))
+
+    def _load(self, n_months: int):
+        """reads the ledger, accounts inputs and persondf into arrays with room for n_months of new orders"""
+        realmc = self.realmc
+        ledger, costing = realmc.mm_orders, realmc.mm_costing
+        if costing.refresh():
+            costing.reprice(ledger)
+        ledger.settle()
+
+        #ledger chunks that are open or dated from this month on; their statuses are written back by flush
+        months = sorted(ledger.open_months | {m for m in ledger.chunks if m >= realmc.month})
+        self.segments = [(m, len(ledger.chunks[m])) for m in months]
+        n_loaded = sum(n for m, n in self.segments)
+
+        #orders simulated ahead (e.g. the opening orders of InitializeMM), recieved in their month
+        sandbox = realmc.mm_dfs['qa_sandbox_orders']
+        pending = sandbox.loc[sandbox['order_date'] >= realmc.month]
+        self.pending = dict(tuple(pending.groupby('order_date', sort=False)))
+
+        size = n_loaded + len(pending) + n_months * realmc.mm_params['n_orders']
+        self.orders = {col: np.zeros(size, dtype=dt) for col, dt in ORDER_ARRAYS.items()}
+        self.order_id = np.empty(size, dtype=object) #for mm_events
+        start = 0
+        for m, n in self.segments:
+            chunk = ledger.chunks[m]
+            for col in ORDER_ARRAYS:
+                self.orders[col][start:start + n] = chunk[col].to_numpy(dtype=float)
+            self.order_id[start:start + n] = chunk['order_id'].to_numpy()
+            start += n
+        self.n = n_loaded
+        self.recieved = [] #(priced frame, raw batch or None, first slot) per recieved part
+        self.batch = None #the latest raw monthly batch, kept as qa_sandbox_orders
+
+        #where the manufacturer and the resource locations of a product are booked
+        resource_master = realmc.mm_dfs['mm_resource_master']
+        self.prod_loc = ops.product_locations(realmc)
+        self.res_loc = resource_master['location_id'].to_numpy()
+        self.res_code = resource_master['resource_code'].to_numpy()
+
+        self.savings = realmc.persondf['savings'].fillna(0).to_numpy(dtype=float).copy()
+        self.paid = False
+        self.check_hr = True #employees are checked in the first month
+
+        #the orders in production go into a queue with the ledger's capacities, due as the ledger has them
+        self.queue = ManufacturingQueue(ledger.queue.capacity, ledger.queue.max_delay)
+        self.due = np.full(size, np.nan)
+        status = self.orders['order_status'][:n_loaded]
+        slots = np.flatnonzero(status > 0)
+        self.due[slots] = realmc.month + status[slots]
+        self.queue.insert(None, slots, self.due[slots], self._loc(slots))
+
+    def _loc(self, slots: np.ndarray) -> np.ndarray:
+        """location_id making the orders in slots; -1 if none"""
+        code = self.orders['product_code'][slots]
+        return np.where(code >= 0, self.prod_loc[np.maximum(code, 0)], -1)
+
+    def _add_orders(self, arrays: dict, order_id: np.ndarray, receivable: np.ndarray, priced: pd.DataFrame = None, raw: dict = None):
+        """copies the ORDER_ARRAYS of new orders into the next slots and queues them (OrderLedger.append)"""
+        n = len(arrays['order_date'])
+        slots = np.arange(self.n, self.n + n)
+        for col in ORDER_ARRAYS:
+            self.orders[col][slots] = arrays[col]
+        self.order_id[slots] = order_id
+        month = self.realmc.month
+        loc = self._loc(slots)
+        status = self.queue.schedule(None, slots, month, self.orders['order_status'][slots], loc)
+        self.orders['order_status'][slots] = status
+        self.due[slots] = np.where(status > 0, month + status, np.nan)
+        rejected = status == -1
+        for event, q1 in (('order_accepted', ~rejected), ('order_rejected', rejected)):
+            self.realmc.mm_events.log(event, month, location_id=loc[q1], order_id=order_id[q1], amount=receivable[q1])
+        self.recieved.append((priced, raw, self.n))
+        self.n += n
+
+    def recieve(self, month: int, raw: dict, solvent: np.ndarray):
+        """prices the pending orders and the batch of month and adds them (operations.recieve_orders); orders of insolvent locations are left out"""
+        realmc = self.realmc
+        costing = realmc.mm_costing
+        if month in self.pending:
+            pending = self.pending[month]
+            pending = pending.loc[ops.solvent_orders(realmc, pending['product_id'], solvent)]
+            priced = costing.price(pending.reset_index(drop=True))
+            self._add_orders({col: priced[col].to_numpy(dtype=float) for col in ORDER_ARRAYS}, priced['order_id'].to_numpy(),
+                             priced['account_receivable'].to_numpy(dtype=float), priced=priced)
+
+        #orders of insolvent locations and of products without a bill of materials are left out (CostEngine.price)
+        code = realmc.mm_codes.encode(raw['product_id'], 'product_id')
+        keep = costing.priceable(code)
+        if not solvent.all():
+            keep &= ops.solvent_orders(realmc, raw['product_id'], solvent)
+        if not keep.all():
+            raw = {col: v[keep] if isinstance(v, np.ndarray) else v for col, v in raw.items()}
+            code = code[keep]
+
+        #the batch is priced like CostEngine.price, without building its frame
+        quantity = raw['product_quantity']
+        self._add_orders({
+            'order_date': np.full(len(code), month),
+            'product_code': code,
+            'product_quantity': quantity,
+            'order_status': raw['order_status'],
+            'profit': raw['account_receivable'] - quantity * costing.unit_cost[code],
+            'sales_tax': raw['account_receivable'] * realmc.mm_params['sales_tax_rate'],
+        }, raw['order_id'], raw['account_receivable'], raw=raw)
+
+    def manufacture(self, month: int) -> np.ndarray:
+        """returns the slots of the orders completed in month, in ledger order (OrderLedger.advance)"""
+        done = np.sort(np.concatenate([rows for tag, rows in self.queue.pop(month)] + [np.empty(0, dtype=np.int64)]))
+        self.orders['order_status'][done] = 0
+        self.due[done] = np.nan
+        self.realmc.mm_events.log('order_completed', month, location_id=self._loc(done), order_id=self.order_id[done],
+                                  amount=self.orders['profit'][done])
+        return done
+
+    def book(self, done: np.ndarray):
+        """books profit, sales tax and resource payouts of the completed orders (mm_operations.update_books)"""
+        realmc, o = self.realmc, self.orders
+        accounts = realmc.mm_accounts
+        code = o['product_code'][done]
+        loc = self.prod_loc[code]
+        profit = accounts.per_location(loc, o['profit'][done])
+        salestax = accounts.per_location(loc, o['sales_tax'][done])
+        res_payout = realmc.mm_costing.resource_payout_codes(code, o['product_quantity'][done])
+        payout = accounts.per_location(self.res_loc, res_payout[self.res_code])
+        accounts.post(income=profit + payout, sales_tax=salestax)
+        for event, amounts in (('sale', profit), ('resource_payout', payout), ('sales_tax', salestax)):
+            realmc.mm_events.log_postings(event, realmc.month, amounts)
+
+    def pay(self, solvent: np.ndarray):
+        """pays the employees of solvent locations into savings and out of their location's balance (mm_hr.pay_employees)"""
+        realmc = self.realmc
+        payroll = realmc.mm_payroll
+        payroll.positions() #refreshed if employees were hired
+        pay = np.where(solvent[payroll.loc], payroll.wages(), 0.0)
+        payroll.credit(self.savings, pay)
+        wages = realmc.mm_accounts.per_location(payroll.loc, pay)
+        realmc.mm_accounts.post(income=-wages)
+        realmc.mm_events.log_postings('wages', realmc.month, -wages)
+        self.paid = True
+
+    def apply_schedule(self, month: int):
+        """applies the population changes scheduled for month to persondf"""
+        changes = self.schedule.get(month)
+        if changes is None:
+            return
+        persondf = self.realmc.persondf
+        pos = pd.Index(persondf['pid']).get_indexer(changes['pid'])
+        q1 = pos >= 0
+        for col in changes.columns.drop(['month', 'pid']):
+            persondf.iloc[pos[q1], persondf.columns.get_loc(col)] = changes[col].to_numpy()[q1]
+        self.check_hr = True
+
+    def hr(self, solvent: np.ndarray):
+        """checks and rehires the employees of solvent locations when the population could have changed since the last check"""
+        if self.check_hr:
+            replaced = ops.mm_hr(self.realmc, self.realmc.mm_params['chunk_size'], pay=False, solvent=solvent)
+            #a hire can leave a shared employee to replace next month; insolvent locations are checked once they recover
+            self.check_hr = len(replaced) > 0 or not solvent.all()
+        self.pay(solvent)
+
+    def run(self, n_months: int, save_every: int = None, fname: str = None, fmt: str = 'sqlite'):
+        """
+        Projects n_months; the state is written back at the end and, with save_every, saved to fname every
+            save_every months (Realm.SaveAll).
+        """
+        realmc = self.realmc
+        prof = realmc.mm_profiler
+        prof.enabled = realmc.mm_params['profile']
+        self._load(n_months)
+        stream = realmc.mm_order_stream
+        for i in range(n_months):
+            with prof.stage('project_mm', realmc.month, rows_in=len(self.queue)) as rec:
+                raw = stream.draw(realmc.month)
+                self.batch = raw
+                solvent = ops.check_solvency(realmc)
+                if solvent.any():
+                    self.recieve(realmc.month, raw, solvent)
+
+                realmc.month += 1 #population frozen apart from the schedule
+                self.apply_schedule(realmc.month)
+
+                done = self.manufacture(realmc.month)
+                self.book(done)
+                rec.rows_out = len(done)
+                solvent = ops.check_solvency(realmc)
+                if solvent.any():
+                    self.hr(solvent)
+                ops.mm_tax(realmc, ops.check_solvency(realmc)) #the period is always closed; CIT only for solvent locations
+
+            if save_every and (i + 1) % save_every == 0 and i + 1 < n_months:
+                self.flush()
+                realmc.SaveAll(fname, fmt)
+                self._load(n_months - i - 1)
+        self.flush()
+
+    def flush(self):
+        """writes the arrays back into the order ledger, mm_dfs and persondf"""
+        realmc, ledger = self.realmc, self.realmc.mm_orders
+        status = np.where(np.isfinite(self.due), self.due - realmc.month, self.orders['order_status'])
+
+        #statuses of the ledger chunks that were loaded
+        start = 0
+        for m, n in self.segments:
+            chunk = ledger.chunks[m]
+            chunk['order_status'] = status[start:start + n].astype(chunk['order_status'].dtype)
+            start += n
+
+        #recieved orders, with their current statuses, in the order they were recieved
+        parts = []
+        for priced, raw, slot in self.recieved:
+            if priced is None:
+                priced = realmc.mm_costing.price(pd.DataFrame(raw, columns=ORDER_COLS))
+            priced = priced.copy()
+            dtype = priced['order_status'].dtype
+            priced['order_status'] = status[slot:slot + len(priced)].astype(dtype)
+            parts.append(priced)
+        if parts:
+            ledger.append(pd.concat(parts, ignore_index=True), schedule=False)
+        months = {m for m, n in self.segments} | {m for p in parts for m in p['order_date'].unique()}
+        ledger.requeue(months, clock=realmc.month)
+        archive.retain(realmc) #spill closed orders and periods past archive_keep (if archive_path is set)
+
+        if self.batch is not None:
+            #only the orders simulated ahead and the latest batch are kept; the ledger holds the history
+            sandbox = realmc.mm_dfs['qa_sandbox_orders']
+            realmc.mm_dfs['qa_sandbox_orders'] = pd.concat(
+                [sandbox.loc[sandbox['order_date'] >= realmc.month], pd.DataFrame(self.batch, columns=ORDER_COLS)],
+                ignore_index=True)
+        realmc.mm_dfs['mm_order_master'] = ledger.to_frame(archived=False)
+        realmc.mm_accounts.sync()
+        if self.paid:
+            realmc.persondf['savings'] = self.savings
+        realmc.mm_events.flush()
+        self.recieved, self.batch = [], None
+
+def project_mm(realmc, n_months: int, schedule: pd.DataFrame = None, save_every: int = None, fname: str = None, fmt: str = 'sqlite'):
+    """
+    Runs the MM economy of realmc for n_months without population dynamics (see MMProjection).
+
+    inpts:
+        realmc (class Realm obj): E, after InitializeMM
+        n_months (int): months to project
+        schedule (pd.DataFrame): optional deaths/moves; columns month, pid and persondf columns (death, locv, loch, ...)
+        save_every (int): save a checkpoint to fname (format fmt) every save_every months
+    """
+    MMProjection(realmc, schedule).run(n_months, save_every, fname, fmt)
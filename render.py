@@ -0,0 +1,197 @@
+"""Vectorized rendering of mm_location_master markers onto the island."""
+###import dependencies
+import os
+import numpy as np
+import pandas as pd
+import islandmap
+
+#subdomain : marker color (r, g, b) in 0-255
+SUBDOMAIN_COLORS = {
+    'farming': (255, 0, 50), #magenta
+    'mining': (255, 255, 0), #yellow
+    'energy': (255, 128, 0), #orange
+    'manufacturing': (0, 0, 0), #black
+}
+OTHER_COLOR = (255, 255, 255) #subdomains not in the color map
+SOLVENT_COLOR, INSOLVENT_COLOR = (0, 200, 0), (220, 0, 0)
+
+def downsample(img: np.ndarray, scale: int) -> np.ndarray:
+    """returns img averaged over scale x scale blocks (edges that do not fill a block are cut); img itself if scale is 1"""
+    if scale == 1:
+        return img
+    v, h = img.shape[0] // scale, img.shape[1] // scale
+    blocks = np.asarray(img[:v*scale, :h*scale]).reshape(v, scale, h, scale, *img.shape[2:])
+    return blocks.mean(axis=(1, 3)).astype(img.dtype)
+
+def ramp(values: np.ndarray, lo: float = None, hi: float = None) -> np.ndarray:
+    """
+    Maps values onto a red (lo) -> yellow -> green (hi) ramp.
+        -by default the ramp is centered on 0 (lo = -hi = -max |value|), so losses are red and profits green
+
+    opts:
+        (n, 3) colors in 0-255; nan values are OTHER_COLOR
+    """
+    values = np.asarray(values, dtype=float)
+    if hi is None or lo is None:
+        top = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 1.0
+        lo, hi = (-top if lo is None else lo), (top if hi is None else hi)
+    t = np.clip((values - lo) / ((hi - lo) or 1.0), 0, 1)
+    colors = np.column_stack([np.interp(t, [0, 0.5, 1], [255, 255, 0]), np.interp(t, [0, 0.5, 1], [0, 255, 200]), np.zeros(len(t))])
+    colors[np.isnan(values)] = OTHER_COLOR
+    return colors
+
+def marker_pixels(coords: np.ndarray, size: int, shape: tuple) -> tuple:
+    """
+    Returns the pixels of a size x size square marker around each coord, like the notebook loops
+        (center - size//2 to center + size//2, cut at the edges).
+
+    opts:
+        (flat pixel index, marker number) per pixel; where markers overlap only the pixel of the later marker is kept
+    """
+    half = size // 2
+    d = np.arange(-half, half + 1)
+    v = np.broadcast_to(coords[:, 0, None, None] + d[None, :, None], (len(coords), len(d), len(d)))
+    h = np.broadcast_to(coords[:, 1, None, None] + d[None, None, :], (len(coords), len(d), len(d)))
+    marker = np.broadcast_to(np.arange(len(coords))[:, None, None], v.shape)
+    inside = (v >= 0) & (v < shape[0]) & (h >= 0) & (h < shape[1])
+    flat, marker = (v * shape[1] + h)[inside], marker[inside]
+
+    #later markers paint over earlier ones
+    flat, marker = flat[::-1], marker[::-1]
+    flat, first = np.unique(flat, return_index=True)
+    return flat, marker[first]
+
+class Renderer:
+    """
+    Draws location markers on one reusable canvas of an island layer.
+
+    inpts:
+        isle (dict): realmc.isle
+        layer (str): the (v, h, channel) image drawn on
+        scale (int): downsampling factor; 1 draws at full resolution
+        marker (int): marker side in full resolution pixels (pixel_size in the notebooks)
+        colors (dict): subdomain : (r, g, b) in 0-255; defaults to SUBDOMAIN_COLORS
+    """
+    def __init__(self, isle: dict, layer: str = 'raw', scale: int = 1, marker: int = 15, colors: dict = None):
+        self.scale = int(scale)
+        self.marker = max(1, int(round(marker / self.scale)))
+        self.colors = {**SUBDOMAIN_COLORS, **(colors or {})}
+        self.base = downsample(isle[layer], self.scale) #read only at scale 1 (the shared map)
+        self.canvas = islandmap.canvas(isle, layer) if self.scale == 1 else self.base.copy()
+        self.unit = 255.0 if self.canvas.dtype.kind in 'iu' else 1.0 #float images are in 0-1
+        self.drawn = np.empty(0, dtype=np.int64) #flat pixels stamped by the last render
+
+    def _pixels(self, img: np.ndarray) -> np.ndarray:
+        """img as (pixels, channels); a view"""
+        return img.reshape(img.shape[0] * img.shape[1], -1)
+
+    def clear(self):
+        """puts back the base pixels under the markers of the last render"""
+        self._pixels(self.canvas)[self.drawn] = self._pixels(self.base)[self.drawn]
+        self.drawn = self.drawn[:0]
+
+    def marker_colors(self, location_master: pd.DataFrame, color_by: str = 'subdomain', values=None, debt_thold: float = -50000) -> np.ndarray:
+        """
+        Returns the (r, g, b) 0-255 color of each row of location_master.
+
+        inpts:
+            color_by (str): 'subdomain', 'balance' (see ramp) or 'solvent' (balance >= debt_thold)
+            values (np.ndarray): balances to color by instead of location_master['balance'] (e.g. mm_accounts.balance)
+        """
+        if color_by == 'subdomain':
+            return np.array([self.colors.get(s, OTHER_COLOR) for s in location_master['subdomain']], dtype=float).reshape(-1, 3)
+        balance = location_master['balance'].to_numpy(dtype=float) if values is None else np.asarray(values, dtype=float)
+        if color_by == 'balance':
+            return ramp(balance)
+        if color_by == 'solvent':
+            return np.where((balance >= debt_thold)[:, None], SOLVENT_COLOR, INSOLVENT_COLOR).astype(float)
+        raise ValueError(f"unknown color_by {color_by}; expected 'subdomain', 'balance' or 'solvent'")
+
+    def render(self, location_master: pd.DataFrame, color_by: str = 'subdomain', values=None, debt_thold: float = -50000,
+               window: tuple = None) -> np.ndarray:
+        """
+        Draws the locations of location_master (over the previous render) and returns the frame.
+
+        inpts:
+            location_master (pd.DataFrame): mm_location_master
+            color_by, values, debt_thold: see marker_colors
+            window (tuple): (v0, v1, h0, h1) in full resolution pixels; None for the whole island
+
+        opts:
+            a view of the canvas (see tile); it changes with the next render
+        """
+        self.clear()
+        coords = np.array(location_master['location_coord'].to_list(), dtype=float).reshape(-1, 2)
+        coords = coords.astype(np.int64) // self.scale
+        flat, which = marker_pixels(coords, self.marker, self.canvas.shape)
+        colors = self.marker_colors(location_master, color_by, values, debt_thold) / 255.0 * self.unit
+        self._pixels(self.canvas)[flat, :3] = colors[which].astype(self.canvas.dtype)
+        self.drawn = flat
+        return self.tile(window)
+
+    def render_realm(self, realmc, color_by: str = 'subdomain', window: tuple = None) -> np.ndarray:
+        """render() of realmc's locations, colored with the live balances of mm_accounts"""
+        accounts = realmc.mm_accounts
+        values = None if accounts is None else accounts.balance
+        return self.render(realmc.mm_dfs['mm_location_master'], color_by, values, realmc.mm_params['mm_debt_thold'], window)
+
+    def tile(self, window: tuple = None) -> np.ndarray:
+        """returns the (v0, v1, h0, h1) window (full resolution pixels) of the canvas; the whole canvas if None"""
+        if window is None:
+            return self.canvas
+        v0, v1, h0, h1 = (int(x) // self.scale for x in window)
+        return self.canvas[v0:v1, h0:h1]
+
+def save_frame(frame: np.ndarray, fname: str):
+    """writes frame as an image (png, ...) through matplotlib, or as .npy"""
+    if fname.endswith('.npy'):
+        np.save(fname, frame)
+        return
+    try:
+        import matplotlib.image
+    except ImportError as e:
+        raise ImportError('image frames need matplotlib (pip install matplotlib); use fmt="npy" otherwise') from e
+    matplotlib.image.imsave(fname, np.clip(frame, 0, 1) if frame.dtype.kind == 'f' else frame)
+
+class FrameWriter:
+    """
+    Writes one frame per month of a run to path as it goes (nothing is kept in memory); pass it to
+        EvolveMM(..., on_month=writer).
+
+    inpts:
+        renderer (Renderer): the renderer (and canvas) to draw with
+        path (str): directory for the frames; created if needed
+        color_by (str): see Renderer.marker_colors
+        window (tuple): see Renderer.tile
+        every (int): write every every-th month
+        fmt (str): file extension of the frames, e.g. 'png' or 'npy'
+    """
+    def __init__(self, renderer: Renderer, path: str, color_by: str = 'subdomain', window: tuple = None, every: int = 1, fmt: str = 'png'):
+        self.renderer = renderer
+        self.path = path
+        self.color_by = color_by
+        self.window = window
+        self.every = every
+        self.fmt = fmt
+        self.frames: list = [] #file names written, in order
+        os.makedirs(path, exist_ok=True)
+
+    def __call__(self, realmc):
+        if realmc.month % self.every:
+            return
+        frame = self.renderer.render_realm(realmc, self.color_by, self.window)
+        fname = os.path.join(self.path, f'frame_{realmc.month:06d}.{self.fmt}')
+        save_frame(frame, fname)
+        self.frames.append(fname)
+
+def record(realmc, months: int, path: str, addpeep: int = 0, dometh: int = 0, migrate: bool = False,
+           color_by: str = 'solvent', scale: int = 4, window: tuple = None, every: int = 1, fmt: str = 'png') -> list:
+    """
+    Runs realmc.EvolveMM for months and writes a frame of the locations every every-th month to path.
+
+    opts:
+        the file names of the frames
+    """
+    writer = FrameWriter(Renderer(realmc.isle, scale=scale), path, color_by, window, every, fmt)
+    realmc.EvolveMM(months, addpeep, dometh, migrate, on_month=writer)
+    return writer.frames
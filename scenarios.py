@@ -0,0 +1,124 @@
+"""Runs mm_params / loc_gen_dict scenario sweeps in parallel on forked copies of a Realm."""
+###import dependencies
+import copy
+import itertools
+import multiprocessing as mp
+import os
+import numpy as np
+import pandas as pd
+import islandmap
+import archive
+
+#set in the parent right before the pool forks; read by the workers
+_BASE = None
+_SCENARIOS = None
+_RUN_ARGS = None
+
+def sweep(grid: dict, loc_gen_dicts: dict = None) -> list:
+    """
+    Builds the scenarios of a full grid sweep.
+
+    inpts:
+        grid (dict): mm_params key : list of values
+        loc_gen_dicts (dict): optional name : loc_gen_dict to sweep as well
+
+    opts:
+        a list of scenario dicts with 'name', 'mm_params' and (if swept) 'loc_gen_dict'
+    """
+    keys = list(grid)
+    layouts = list((loc_gen_dicts or {None: None}).items())
+    scenarios = []
+    for values in itertools.product(*[grid[k] for k in keys]):
+        for layout, loc_gen_dict in layouts:
+            params = dict(zip(keys, values))
+            name = ','.join(f'{k}={v}' for k, v in params.items())
+            scenario = {'name': name if layout is None else f'{name},layout={layout}', 'mm_params': params}
+            if layout is not None:
+                scenario['layout'] = layout
+                scenario['loc_gen_dict'] = loc_gen_dict
+            scenarios.append(scenario)
+    return scenarios
+
+def run_scenario(realmc, scenario: dict, months: int, addpeep: int = 0, dometh: int = 0, migrate: bool = False, seed: int = 0) -> pd.DataFrame:
+    """
+    Runs one scenario on realmc in place and returns its results.
+        -InitializeMM is run if realmc has no MM state yet or the scenario sets a loc_gen_dict
+
+    opts:
+        the scenario's mm_books rows with the scenario name, its swept params, the location's subdomain,
+            its final balance and whether it ended solvent (balance >= mm_debt_thold)
+    """
+    realmc.mm_params.update(scenario.get('mm_params', {}))
+    realmc.mm_params['dbug'] = False
+    if realmc.mm_params.get('archive_path') is not None and 'archive_path' not in scenario.get('mm_params', {}):
+        #each scenario spills to its own archive; months the base Realm spilled are read from the base archive
+        realmc.mm_params['archive_path'] = os.path.join(realmc.mm_params['archive_path'], scenario['name'])
+    np.random.seed(seed) #wages draw from the global numpy state
+    if scenario.get('loc_gen_dict') is not None:
+        realmc.loc_gen_dict = scenario['loc_gen_dict']
+    if realmc.mm_orders is None or scenario.get('loc_gen_dict') is not None:
+        realmc.InitializeMM()
+    realmc.EvolveMM(months, addpeep, dometh, migrate)
+
+    location_master = realmc.mm_dfs['mm_location_master']
+    final = location_master.drop_duplicates('location_id').set_index('location_id')[['subdomain', 'balance']]
+    res = archive.history(realmc, 'mm_books').join(final, on='location_id')
+    res['solvent'] = res['balance'] >= realmc.mm_params['mm_debt_thold']
+    res.insert(0, 'scenario', scenario['name'])
+    for i, (k, v) in enumerate(scenario.get('mm_params', {}).items()):
+        res.insert(1 + i, k, v)
+    if 'layout' in scenario:
+        res.insert(1, 'layout', scenario['layout'])
+    return res.drop(columns='location_id').rename(columns={'balance': 'final_balance'})
+
+def copy_realm(realmc):
+    """
+    deep copy of realmc; the DNA database cursor cannot be copied and is shared (it is only read)
+        -a Realm made with lazy=True that never opened the cursor is copied without opening it
+        -the memory mapped island layers are shared too (islandmap.py)
+    """
+    memo = {}
+    dnacur, isle = vars(realmc).get('dnacur'), vars(realmc).get('isle')
+    if dnacur is not None:
+        memo[id(dnacur)] = dnacur
+    if isinstance(isle, dict):
+        memo.update(islandmap.shared(isle))
+    return copy.deepcopy(realmc, memo)
+
+def _run_forked(i: int) -> pd.DataFrame:
+    """pool task: runs scenario i on this worker's forked copy of the base Realm"""
+    months, addpeep, dometh, migrate, seed = _RUN_ARGS
+    return run_scenario(_BASE, _SCENARIOS[i], months, addpeep, dometh, migrate, seed)
+
+def run_scenarios(realmc, scenarios: list, months: int, addpeep: int = 0, dometh: int = 0, migrate: bool = False,
+                  seed: int = 0, processes: int = None) -> pd.DataFrame:
+    """
+    Runs the scenarios in parallel, each on its own copy of realmc, and stacks their results (see run_scenario).
+        -needs the fork start method (linux, macOS); elsewhere the scenarios run one after another on deep copies
+        -realmc itself is not changed
+
+    inpts:
+        realmc (class Realm obj): the base Realm; population loaded and, optionally, InitializeMM already run
+        scenarios (list): scenario dicts (see sweep); each needs a unique 'name'
+        months (int): months of EvolveMM per scenario
+        seed (int): numpy global seed every scenario starts from, so scenarios only differ by their params
+        processes (int): pool size; defaults to the number of cores
+
+    opts:
+        one tidy DataFrame: one row per scenario, location and accounting period
+    """
+    global _BASE, _SCENARIOS, _RUN_ARGS
+    processes = min(processes or os.cpu_count() or 1, len(scenarios))
+
+    if 'fork' not in mp.get_all_start_methods():
+        results = [run_scenario(copy_realm(realmc), s, months, addpeep, dometh, migrate, seed) for s in scenarios]
+        return pd.concat(results, ignore_index=True)
+
+    _BASE, _SCENARIOS, _RUN_ARGS = realmc, scenarios, (months, addpeep, dometh, migrate, seed)
+    try:
+        #one fresh fork per scenario (maxtasksperchild=1), so no scenario sees another's changes
+        with mp.get_context('fork').Pool(processes, maxtasksperchild=1) as pool:
+            results = pool.map(_run_forked, range(len(scenarios)), chunksize=1)
+    finally:
+        _BASE = _SCENARIOS = _RUN_ARGS = None
+    return pd.concat(results, ignore_index=True)
@@ -0,0 +1,185 @@
+"""Vectorized location selection and workforce seeding for Realm.InitializeMM."""
+###import dependencies
+import re
+import numpy as np
+import pandas as pd
+import spatial
+import catalog
+import eligibility
+
+ISLAND_SIZE = 2048
+
+#subdomain : band of isle['raw'] holding its resource
+RESOURCE_BANDS = {'farming': 1, 'mining': 0, 'energy': 2}
+
+def dense_chunks(realmc, chunk_size: int = 64, min_workers: int = 5) -> np.ndarray:
+    """
+    Bins the adults that can work into chunk_size x chunk_size chunks of the island.
+
+    opts:
+        (v center, h center, people) of the chunks with at least min_workers people
+    """
+    persondf = realmc.persondf
+    adults = eligibility.eligibility_index(realmc).available() #adults who are alive and can take a job
+    vh = persondf[['locv', 'loch']].to_numpy()[adults]
+
+    num_bins = int(ISLAND_SIZE / chunk_size)
+    H, v_edges, h_edges = np.histogram2d(vh[:, 0], vh[:, 1], bins=num_bins, range=[[0, ISLAND_SIZE], [0, ISLAND_SIZE]])
+    v_idx, h_idx = np.argwhere(H >= min_workers).T
+    return np.stack([v_edges[v_idx] + chunk_size/2, h_edges[h_idx] + chunk_size/2, H[v_idx, h_idx]], axis=1)
+
+def nearest_resource(resource: np.ndarray, chunks: np.ndarray, max_dist: float, block: int = 1 << 22) -> tuple:
+    """
+    Finds the resource pixel nearest to each chunk center, looking only at the pixels within max_dist.
+
+    inpts:
+        resource (np.ndarray): boolean image of the resource pixels
+        chunks (np.ndarray): rows of (v, h, ...) chunk centers
+        max_dist (float): search radius; chunks without a resource pixel this close are not found
+        block (int): pixels compared at a time (bounds memory)
+
+    opts:
+        (found, closest (v, h) pixel, distance) per chunk; ties go to the first pixel in row major order,
+            like np.argwhere + np.argsort over the whole image
+    """
+    centers = chunks[:, :2]
+    reach = int(np.ceil(max_dist)) + 1
+    dv, dh = np.meshgrid(np.arange(-reach, reach + 1), np.arange(-reach, reach + 1), indexing='ij')
+    offsets = np.stack([dv.ravel(), dh.ravel()], axis=1) #row major within the window
+
+    closest = np.zeros((len(centers), 2), dtype=np.int64)
+    distance = np.full(len(centers), np.inf)
+    step = max(1, block // len(offsets))
+    for s in range(0, len(centers), step):
+        c = centers[s:s + step]
+        pix = np.floor(c).astype(np.int64)[:, None, :] + offsets[None, :, :]
+        inside = ((pix >= 0) & (pix < np.array(resource.shape[:2]))).all(axis=2)
+        pv, ph = np.clip(pix[..., 0], 0, resource.shape[0] - 1), np.clip(pix[..., 1], 0, resource.shape[1] - 1)
+        d = np.linalg.norm(c[:, None, :] - pix, axis=2)
+        d = np.where(inside & resource[pv, ph], d, np.inf)
+        first = np.argmin(d, axis=1) #first minimum in row major order
+        rows = np.arange(len(c))
+        distance[s:s + step] = d[rows, first]
+        closest[s:s + step] = pix[rows, first]
+    return distance <= max_dist, closest, distance
+
+def select_locations(realmc, mm_location_master: pd.DataFrame, loc_gen_dict: dict, chunk_size: int = 64, min_workers: int = 5,
+                     resource_threshold: float = 0.9, rmin_dist: float = 3, dbug: bool = False) -> pd.DataFrame:
+    """
+    Selects the locations of each subdomain in loc_gen_dict (initialization.select_location).
+        -resource subdomains (farming, mining, energy) take the dense chunks within rmin_dist of a resource pixel
+            and with min_workers (loc_gen_dict[subdomain][2]) <= people < loc_gen_dict[subdomain][1]
+        -manufacturing takes the dense chunks with more than loc_gen_dict[subdomain][2] people
+        -loc_gen_dict[subdomain][0] of them are sampled (initialization.add_sel_locs)
+
+    inpts:
+        mm_location_master (pd.DataFrame): the (empty) mm_location_master of initialization.create_mm_dfs
+        loc_gen_dict (dict): subdomain : (number of locations, max people, min people)
+
+    opts:
+        mm_location_master with the selected locations
+    """
+    import initialization as initf
+    chunks = dense_chunks(realmc, chunk_size, min_workers)
+    if dbug: print(chunks)
+
+    nearest = {} #band : (found, closest, distance); shared by the subdomains of a resource
+    for subdomain, (n_locs, max_people, min_people) in loc_gen_dict.items():
+        if not n_locs > 0:
+            continue
+        band = next((b for name, b in RESOURCE_BANDS.items() if re.search(name, subdomain)), None)
+        if band is not None:
+            if dbug: print(subdomain, loc_gen_dict[subdomain])
+            if band not in nearest:
+                nearest[band] = nearest_resource(realmc.isle['raw'][:, :, band] > resource_threshold, chunks, rmin_dist)
+            found, closest, distance = nearest[band]
+            q1 = found & (chunks[:, 2] < max_people) & (chunks[:, 2] >= min_people)
+            tempdf = pd.DataFrame(
+                data=np.column_stack([
+                    chunks[q1, :2], closest[q1], distance[q1],
+                    realmc.isle['raw'][closest[q1, 0], closest[q1, 1], band], chunks[q1, 2]
+                ]),
+                columns=['chunk_v', 'chunk_h', 'closest_v', 'closest_h', 'distance', 'resource_val', 'potential_workers']
+            )
+        elif re.search('manufacturing', subdomain):
+            if dbug: print(subdomain, loc_gen_dict[subdomain])
+            tempdf = pd.DataFrame(data=chunks[chunks[:, 2] > min_people][:, :2], columns=['closest_v', 'closest_h'])
+        else:
+            if dbug: print(f'{subdomain} is not a valid subdomain for MM, there may be a typo')
+            continue
+        mm_location_master = initf.add_sel_locs(mm_location_master, tempdf, subdomain, loc_gen_dict)
+    return mm_location_master
+
+def fill_employees(realmc, location_master: pd.DataFrame, employee_master: pd.DataFrame, chunk_size: int = 64, dbug: bool = False) -> pd.DataFrame:
+    """
+    Hires the required_personelle_num nearest adults within the workforce radius of each location
+        (initialization.fill_employee_master); ties go to the earlier row of persondf.
+        -locations sharing a location_coord draw from one ranking, as the coord is their key
+
+    inpts:
+        location_master (pd.DataFrame): mm_location_master after select_locations
+        employee_master (pd.DataFrame): the (empty) mm_employee_master of initialization.create_mm_dfs
+
+    opts:
+        employee_master with the hired employees (location_coord, pid, wage); their persondf.job is set to 3.0
+    """
+    radius = np.sqrt(2*(chunk_size/2)**2) #same radius as mm_hr
+    persondf = realmc.persondf
+    eligible = eligibility.eligibility_index(realmc).available() & (persondf['lastname'] != 'baby').to_numpy()
+    pindex = realmc.mm_person_index = spatial.PersonIndex(persondf, radius, realmc.month) #reused by mm_hr this month
+    pids = persondf['pid'].to_numpy()
+
+    #rows of location_master per location_coord, in order
+    coords = {}
+    for coord, required in zip(location_master['location_coord'], location_master['required_personelle_num']):
+        coords.setdefault(coord, []).append(required)
+
+    parts, hired = [], [pindex.positions(employee_master['pid'])] #persondf rows of the employees
+    for coord, required in coords.items():
+        pos, d = pindex.query(coord, radius, mask=eligible, closed=True)
+        pos = pos[np.argsort(d, kind='stable')]
+
+        #every location at the coord lists each person in turn; keep the ones ranked within its headcount
+        k = len(required)
+        rank = np.arange(1, len(pos)*k + 1, dtype=float)
+        keep = rank <= np.tile(np.asarray(required, dtype=float), len(pos))
+        parts.append(pd.DataFrame({'location_coord': [coord]*int(keep.sum()), 'pid': np.repeat(pids[pos], k)[keep], 'rank': rank[keep]}))
+        hired.append(np.repeat(pos, k)[keep])
+
+    final_assignment_df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['location_coord', 'pid', 'rank'])
+    final_assignment_df = final_assignment_df.sort_values(['location_coord', 'rank'])
+    if dbug: print(final_assignment_df)
+    final_assignment_df = final_assignment_df[['location_coord', 'pid']]
+    final_assignment_df['wage'] = realmc.mm_params['employee_pay']
+
+    employee_master = pd.concat([employee_master, final_assignment_df], ignore_index=True)
+    rows = np.unique(np.concatenate(hired))
+    persondf.iloc[rows[rows >= 0], persondf.columns.get_loc('job')] = 3.0 #employed under MM
+    return employee_master
+
+def initialize_mm(realmc, folder_path: str, loc_gen_dict: dict) -> dict:
+    """
+    initialization.initialize_mm with select_locations and fill_employees; the master tables come from
+        the compiled catalog of folder_path (catalog.py).
+
+    opts:
+        mm_dfs (dict): the MM DataFrames
+    """
+    import initialization as initf
+    (mm_product_master, mm_manufacture_master, mm_resource_master, mm_location_master,
+     mm_books, mm_order_master, mm_employee_master) = catalog.load(folder_path).create_mm_dfs()
+    mm_location_master = select_locations(realmc, mm_location_master, loc_gen_dict)
+    mm_books = initf.add_books(realmc, mm_location_master, mm_books)
+    mm_employee_master = fill_employees(realmc, mm_location_master, mm_employee_master)
+    mm_product_master, mm_resource_master = initf.add_prod_res(mm_location_master, mm_product_master, mm_resource_master, False)
+
+    mm_dfs = {
+        'mm_product_master': mm_product_master,
+        'mm_manufacture_master': mm_manufacture_master,
+        'mm_resource_master': mm_resource_master,
+        'mm_location_master': mm_location_master,
+        'mm_books': mm_books,
+        'mm_order_master': mm_order_master,
+        'mm_employee_master': mm_employee_master,
+    }
+    return initf.fix_dtype(mm_dfs)
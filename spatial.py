@@ -0,0 +1,89 @@
+"""Grid-bucket spatial index over persondf locations for workforce checks and hiring."""
+###import dependencies
+import numpy as np
+import pandas as pd
+
+KEY_OFFSET = 1 << 20 #keeps cell keys positive for negative coords
+
+class PersonIndex:
+    """
+    Buckets the rows of persondf into square cells of side cell_size so a radius query
+        only looks at the people in the cells around the center instead of the whole population.
+        -positions returned are row positions into persondf (use .iloc)
+        -also keeps a pid -> row position index
+
+    inpts:
+        persondf (pd.DataFrame): realmc.persondf
+        cell_size (float): side of a cell; queries with radius <= cell_size only read a 3x3 block of cells
+        month (int): the month the index was built; used to reuse the index within a month
+    """
+    def __init__(self, persondf: pd.DataFrame, cell_size: float, month: int = None):
+        self.month = month
+        self.cell_size = float(cell_size)
+        self.vh = persondf[['locv', 'loch']].to_numpy(dtype=float)
+        self.pids = pd.Index(persondf['pid'])
+
+        #sort row positions by cell key; people without a location are left out
+        ok = np.isfinite(self.vh).all(axis=1)
+        keys = self._keys(np.floor(self.vh[ok] / self.cell_size).astype(np.int64))
+        order = np.argsort(keys, kind='stable')
+        self.sorted_pos = np.flatnonzero(ok)[order]
+        self.keys, self.starts, self.counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    def __len__(self) -> int:
+        return len(self.vh)
+
+    @staticmethod
+    def _keys(cells: np.ndarray) -> np.ndarray:
+        """packs (v, h) cell numbers into one int64 key"""
+        return (cells[..., 0] + KEY_OFFSET) * (2 * KEY_OFFSET) + (cells[..., 1] + KEY_OFFSET)
+
+    def positions(self, pids) -> np.ndarray:
+        """returns the row positions of pids in persondf; -1 where the pid is not found"""
+        return self.pids.get_indexer(pids)
+
+    def query(self, center, radius: float, mask: np.ndarray = None, closed: bool = False) -> tuple:
+        """
+        Finds the people within radius of center.
+
+        inpts:
+            center (tuple): (v, h) coordinate, e.g. a location_coord
+            radius (float): people at a distance < radius (<= if closed) are returned
+            mask (np.ndarray): optional boolean array over persondf rows; only True rows are returned
+
+        opts:
+            (positions, distances) with positions in ascending (persondf) order
+        """
+        center = np.asarray(center, dtype=float)
+        reach = int(np.ceil(radius / self.cell_size))
+        cv, ch = np.floor(center / self.cell_size).astype(np.int64)
+        dv, dh = np.meshgrid(np.arange(-reach, reach + 1), np.arange(-reach, reach + 1), indexing='ij')
+        want = self._keys(np.stack([cv + dv.ravel(), ch + dh.ravel()], axis=1))
+
+        #collect the people in the neighbouring cells
+        idx = np.minimum(np.searchsorted(self.keys, want), len(self.keys) - 1)
+        idx = idx[self.keys[idx] == want] if len(self.keys) else idx[:0] #cells with nobody in them are skipped
+        pos = np.sort(np.concatenate(
+            [self.sorted_pos[s:s + c] for s, c in zip(self.starts[idx], self.counts[idx])] + [np.empty(0, dtype=np.int64)]
+        ))
+        if mask is not None:
+            pos = pos[mask[pos]]
+
+        d = np.linalg.norm(center - self.vh[pos], axis=1)
+        keep = d <= radius if closed else d < radius
+        return pos[keep], d[keep]
+
+    def nearest(self, center, radius: float, k: int = 1, mask: np.ndarray = None) -> np.ndarray:
+        """returns the positions of the (up to) k nearest people within radius of center; ties go to the earlier row"""
+        pos, d = self.query(center, radius, mask)
+        return pos[np.argsort(d, kind='stable')[:k]]
+
+def person_index(realmc, cell_size: float) -> PersonIndex:
+    """
+    Returns realmc.mm_person_index, rebuilding it if it was built in a different month,
+        for a different cell_size, or persondf has changed length since.
+    """
+    pindex = realmc.mm_person_index
+    if pindex is None or pindex.month != realmc.month or pindex.cell_size != cell_size or len(pindex) != len(realmc.persondf):
+        realmc.mm_person_index = PersonIndex(realmc.persondf, cell_size, realmc.month)
+    return realmc.mm_person_index
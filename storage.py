@@ -0,0 +1,235 @@
+"""Arrow / Parquet checkpoint backend for Realm.SaveAll / Realm.ReadAll."""
+###import dependencies
+import json
+import mmap
+import os
+import sqlite3 as sql
+import types
+import numpy as np
+import pandas as pd
+import checkpoint
+import archive
+from orderledger import OrderLedger
+
+#table name : Realm attribute; the tables SaveAll has always written
+POP_TABLES = {
+    'person': 'persondf',
+    'jail': 'jaildf',
+    'wed': 'weddf',
+    'hospital': 'hospdf',
+    'port': 'portdf',
+    'missing': 'missingdf',
+    'movies': 'moviesdf',
+    'inmovie': 'inmoviedf',
+}
+
+#format : (file extension, default compression)
+FORMATS = {'arrow': ('.arrow', None), 'parquet': ('.parquet', 'zstd')}
+
+META_FILE = 'meta.json'
+
+def _pa():
+    """imports pyarrow; it is only needed for columnar checkpoints"""
+    try:
+        import pyarrow as pa
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError('columnar checkpoints need pyarrow (pip install pyarrow); use fmt="sqlite" otherwise') from e
+    return pa
+
+def is_columnar(path: str) -> bool:
+    """True if path is a columnar checkpoint directory"""
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+class ColumnarStore:
+    """
+    A directory of tables stored in one columnar format.
+
+    inpts:
+        path (str): checkpoint directory; created on the first write
+        fmt (str): 'arrow' or 'parquet'; read from meta.json if the checkpoint exists
+        compression (str): codec for new files (e.g. 'zstd', 'lz4'); None for the format's default
+        memory_map (bool): read files memory-mapped
+    """
+    def __init__(self, path: str, fmt: str = None, compression: str = None, memory_map: bool = True):
+        self.pa = _pa()
+        self.path = path
+        self.meta = self.read_meta() if is_columnar(path) else {}
+        self.fmt = fmt or self.meta.get('format', 'arrow')
+        if self.fmt not in FORMATS:
+            raise ValueError(f'unknown columnar format {self.fmt}; expected one of {list(FORMATS)}')
+        self.ext, default = FORMATS[self.fmt]
+        self.compression = compression if compression is not None else default
+        self.memory_map = memory_map
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name + self.ext)
+
+    def tables(self) -> list:
+        """returns the names of the tables in the store"""
+        return self.meta.get('tables', [])
+
+    def write(self, name: str, df: pd.DataFrame):
+        """writes df (index included) as table name; replaces the file atomically"""
+        pa = self.pa
+        cols = checkpoint.schema(df)
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        codecs = {c: codec for c, (dtype, codec) in cols.items() if codec}
+        table = table.replace_schema_metadata({**table.schema.metadata, b'mm_codecs': json.dumps(codecs).encode()})
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self._file(name) + '.tmp'
+        if self.fmt == 'arrow':
+            pa.feather.write_feather(table, tmp, compression=self.compression or 'uncompressed')
+        else:
+            pa.parquet.write_table(table, tmp, compression=self.compression or 'none')
+        os.replace(tmp, self._file(name))
+        if name not in self.tables():
+            self.meta['tables'] = self.tables() + [name]
+
+    def read(self, name: str) -> pd.DataFrame:
+        """reads table name back with its saved dtypes, index and tuple/list columns"""
+        pa = self.pa
+        mm = base = None
+        if self.fmt == 'arrow' and self.memory_map:
+            with open(self._file(name), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) #private copy-on-write pages; writes never reach the file
+            base = pa.py_buffer(mm)
+            table = pa.ipc.open_file(pa.BufferReader(base)).read_all()
+        elif self.fmt == 'arrow':
+            table = pa.ipc.open_file(pa.OSFile(self._file(name), 'rb')).read_all()
+        else:
+            table = pa.parquet.read_table(self._file(name), memory_map=self.memory_map)
+        codecs = json.loads(table.schema.metadata.get(b'mm_codecs', b'{}'))
+        df = table.to_pandas(split_blocks=True) #one block per column, so numeric columns are not consolidated (copied)
+
+        #arrow hands out read-only views; the Realm edits its frames in place, so numeric columns are
+        #   re-viewed from the copy-on-write map and anything else that is still read-only is copied
+        cols = {}
+        for c in df.columns:
+            col = df[c]
+            chunks = table.column(c).chunks if isinstance(c, str) and c in table.column_names else []
+            if mm is not None and len(chunks) == 1 and chunks[0].null_count == 0 and (
+                    pa.types.is_integer(chunks[0].type) or pa.types.is_floating(chunks[0].type)):
+                ch = chunks[0]
+                dt = np.dtype(ch.type.to_pandas_dtype())
+                offset = ch.buffers()[1].address - base.address + ch.offset * dt.itemsize
+                cols[c] = np.frombuffer(mm, dtype=dt, count=len(ch), offset=offset)
+            elif isinstance(col.dtype, np.dtype) and not col.to_numpy().flags.writeable:
+                cols[c] = col.copy()
+            elif codecs.get(c): #list columns come back as arrays
+                to = tuple if codecs[c] == 'tuple' else list
+                cols[c] = [None if v is None else to(v.tolist()) for v in col]
+            else:
+                cols[c] = col
+        return pd.DataFrame(cols, index=df.index, columns=df.columns, copy=False)
+
+    def read_meta(self) -> dict:
+        with open(os.path.join(self.path, META_FILE)) as f:
+            return json.load(f)
+
+    def write_meta(self, meta: dict):
+        """updates and (atomically) rewrites meta.json; written after the tables"""
+        self.meta.update(meta)
+        self.meta['format'] = self.fmt
+        tmp = os.path.join(self.path, META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f, indent=1, default=checkpoint.json_default)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
+
+#Whole checkpoints: {table: df}, month, MM meta
+def _mm_frames(realmc) -> dict:
+    """the MM tables of realmc, with mm_order_master taken from the live order ledger (and the archived history)"""
+    if getattr(realmc, 'mm_orders', None) is None:
+        return {}
+    return {**realmc.mm_dfs, 'mm_order_master': realmc.mm_orders.to_frame(), 'mm_books': archive.history(realmc, 'mm_books')}
+
+def write_columnar(path: str, tables: dict, month: int, mm: dict = None, fmt: str = 'arrow', compression: str = None):
+    """writes the tables, the clock and the MM meta (None if there is no MM state) as a columnar checkpoint"""
+    store = ColumnarStore(path, fmt, compression)
+    store.meta['tables'] = []
+    for name, df in tables.items():
+        store.write(name, df)
+    store.write_meta({'month': month, 'mm': mm})
+
+def load_columnar(path: str, memory_map: bool = True) -> tuple:
+    """
+    Reads a columnar checkpoint.
+
+    opts:
+        (tables, month, mm meta); the MM meta is None if the checkpoint has no MM state
+    """
+    store = ColumnarStore(path, memory_map=memory_map)
+    return {name: store.read(name) for name in store.tables()}, store.meta['month'], store.meta.get('mm')
+
+def write_sqlite(fname: str, tables: dict, month: int, mm: dict = None):
+    """writes the tables like Realm.SaveAll; MM tables go through checkpoint.save_mm"""
+    import sqlaccess #pysrc; on the path once Main2 is imported
+
+    conn = sql.connect(fname)
+    cur = conn.cursor()
+    cur.execute('DROP TABlE IF EXISTS clock')
+    sqlaccess.CreateClock(conn, cur, month)
+    for name in POP_TABLES:
+        if name in tables:
+            tables[name].to_sql(name, conn, if_exists='replace')
+    if mm is not None:
+        mm_dfs = {k: v for k, v in tables.items() if k.startswith(('mm_', 'qa_'))}
+        realmc = types.SimpleNamespace(mm_dfs=mm_dfs, mm_orders=OrderLedger(mm_dfs['mm_order_master']), **mm)
+        checkpoint.save_mm(realmc, conn)
+    conn.commit()
+    conn.close()
+
+def load_sqlite(fname: str) -> tuple:
+    """reads a Realm.SaveAll file like Realm.ReadAll; returns (tables, month, mm meta)"""
+    conn = sql.connect(fname)
+    have = checkpoint.sqlite_tables(conn)
+    tables = {name: pd.read_sql(f'SELECT * FROM {name}', conn, index_col='index') for name in POP_TABLES if name in have}
+    if 'wed' in tables:
+        # storing empty DFs may cause dtype changes
+        tables['wed'] = tables['wed'].astype({'husband':int, 'wife':int, 'date':int, 'divorce':int, 'spdie':int})
+    month = conn.execute('SELECT * FROM clock').fetchone()[0]
+    mm_dfs, meta = checkpoint.load_mm(conn)
+    conn.close()
+    if mm_dfs is None:
+        return tables, month, None
+    return {**tables, **mm_dfs}, month, {k: meta[k] for k in checkpoint.MM_META}
+
+#Realm hooks
+def save_columnar(realmc, path: str, fmt: str = 'arrow', compression: str = None):
+    """Realm.SaveAll for the columnar formats"""
+    tables = {name: getattr(realmc, attr) for name, attr in POP_TABLES.items()}
+    mm = _mm_frames(realmc)
+    write_columnar(path, {**tables, **mm}, realmc.month, checkpoint.mm_meta(realmc) if mm else None, fmt, compression)
+
+def read_columnar(realmc, path: str, memory_map: bool = True):
+    """Realm.ReadAll for the columnar formats"""
+    tables, realmc.month, mm = load_columnar(path, memory_map)
+    for name, attr in POP_TABLES.items():
+        if name in tables:
+            setattr(realmc, attr, tables[name])
+    if mm is not None:
+        checkpoint.restore_mm(realmc, {k: v for k, v in tables.items() if k not in POP_TABLES}, mm)
+
+def convert(src: str, dst: str, fmt: str = None, compression: str = None):
+    """
+    Converts a checkpoint between the SQLite file written by Realm.SaveAll and a columnar directory.
+
+    inpts:
+        src (str): a SaveAll sqlite file or a columnar checkpoint directory
+        dst (str): where to write the other format
+        fmt (str): 'sqlite', 'arrow' or 'parquet'; by default sqlite -> arrow and columnar -> sqlite
+        compression (str): codec for columnar files
+    """
+    if is_columnar(src):
+        tables, month, mm = load_columnar(src, memory_map=False)
+        fmt = fmt or 'sqlite'
+    else:
+        tables, month, mm = load_sqlite(src)
+        fmt = fmt or 'arrow'
+
+    if fmt == 'sqlite':
+        write_sqlite(dst, tables, month, mm)
+    else:
+        write_columnar(dst, tables, month, mm, fmt, compression)